@@ -1,7 +1,7 @@
 from ninja import NinjaAPI
 
-from api.internal.obscenity_filter.app import texts_handler
-from api.internal.obscenity_filter.routers import add_texts_routers
+from api.internal.obscenity_filter.app import health_handler, moderation_handler, texts_handler
+from api.internal.obscenity_filter.routers import add_health_routers, add_moderation_routers, add_texts_routers
 from config import settings
 
 
@@ -13,6 +13,8 @@ def get_api():
     admin_api = None
 
     add_texts_routers(api, texts_handler)
+    add_health_routers(api, health_handler)
+    add_moderation_routers(api, moderation_handler)
 
     return api, admin_api
 
@@ -0,0 +1,80 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+from api.internal.obscenity_filter.services.metrics import metrics, request_queries
+
+
+def count_query(execute, sql, params, many, context):
+    queries = request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def add_query_counter(sender, connection, **kwargs):
+    # connections of thread pool used by async handlers count queries of their requests too
+    if metrics.enabled and count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(add_query_counter)
+
+
+class MetricsMiddleware:
+    """
+    Observes duration and number of database queries of every request.
+    Does nothing if metrics are disabled.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _start(self):
+        add_query_counter(None, connection)
+        return request_queries.set([0]), time.perf_counter()
+
+    def _finish(self, request, token, started_at):
+        route = request.resolver_match.route if request.resolver_match else "unmatched"
+        metrics.observe("obscenity_request_seconds", time.perf_counter() - started_at, route=route)
+        metrics.observe("obscenity_request_db_queries", request_queries.get()[0], route=route)
+        request_queries.reset(token)
+        metrics.maybe_flush()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not metrics.enabled:
+            return self.get_response(request)
+        token, started_at = self._start()
+        try:
+            return self.get_response(request)
+        finally:
+            self._finish(request, token, started_at)
+
+    async def __acall__(self, request):
+        if not metrics.enabled:
+            return await self.get_response(request)
+        token, started_at = self._start()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._finish(request, token, started_at)
+
+
+def metrics_view(request):
+    """
+    Metrics of all workers in Prometheus text format.
+    """
+    if not metrics.enabled:
+        raise Http404("Metrics are disabled")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
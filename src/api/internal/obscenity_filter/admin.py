@@ -1,4 +1,3 @@
-import csv
 import io
 
 from django import forms
@@ -12,6 +11,7 @@ from django.utils.safestring import mark_safe
 
 from api.internal.obscenity_filter.app import obscenity_filter_service
 from api.internal.obscenity_filter.models import ObsceneWord, SuspiciousWord
+from api.internal.obscenity_filter.services.importer import read_csv_words
 
 
 class CsvImportForm(forms.Form):
@@ -29,7 +29,7 @@ class CsvImportForm(forms.Form):
 @admin.register(ObsceneWord)
 class ObsceneWordsAdmin(admin.ModelAdmin):
     change_list_template = "admin/import_change_list.html"
-    readonly_fields = ["normalized_value"]
+    readonly_fields = ["normalized_value", "version"]
     list_display = ["value", "normalized_value", "similarity"]
     search_fields = ["value", "normalized_value"]
 
@@ -44,14 +44,12 @@ class ObsceneWordsAdmin(admin.ModelAdmin):
         if request.method == "POST":
             csv_file = request.FILES["csv_file"]
 
-            decoded_file = io.TextIOWrapper(csv_file.file, encoding="utf-8")
-            reader = csv.reader(decoded_file)
+            decoded_file = io.TextIOWrapper(csv_file.file, encoding="utf-8", newline="")
+            imported, skipped = obscenity_filter_service.import_obscene_words(read_csv_words(decoded_file))
 
-            for row in reader:
-                for word in row:
-                    obscenity_filter_service.create_obscene_word(word)
-
-            self.message_user(request, "Your csv file has been imported")
+            self.message_user(request, f"Your csv file has been imported, {imported} words")
+            if skipped:
+                self.message_user(request, f"{skipped} too long words were skipped", level=messages.WARNING)
             return redirect("..")
         form = CsvImportForm()
         payload = {"form": form}
@@ -60,6 +58,16 @@ class ObsceneWordsAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         obj.normalized_value = obscenity_filter_service.normalize_word(obj.value)
         super(ObsceneWordsAdmin, self).save_model(request, obj, form, change)
+        obscenity_filter_service.save_skeletons([obj])
+        obscenity_filter_service.dictionary_changed()
+
+    def delete_model(self, request, obj):
+        super(ObsceneWordsAdmin, self).delete_model(request, obj)
+        obscenity_filter_service.dictionary_changed()
+
+    def delete_queryset(self, request, queryset):
+        super(ObsceneWordsAdmin, self).delete_queryset(request, queryset)
+        obscenity_filter_service.dictionary_changed()
 
 
 class DefaultStatusFilter(admin.SimpleListFilter):
@@ -97,6 +105,7 @@ class SuspiciousWordAdmin(admin.ModelAdmin):
     list_display_links = None
     search_fields = ["value"]
     list_filter = (DefaultStatusFilter,)
+    actions = ["approve_selected", "decline_selected"]
 
     def approve_button(self, obj):
         return mark_safe(f'<a class="button" href="/admin/api/suspiciousword/{obj.id}/approve/">Add</a>')
@@ -112,22 +121,25 @@ class SuspiciousWordAdmin(admin.ModelAdmin):
         ]
         return custom_urls + urls
 
+    @admin.action(description="Add selected words to obscene dict")
+    def approve_selected(self, request, queryset):
+        approved = obscenity_filter_service.approve_suspicious_words(queryset.values_list("id", flat=True))
+        self.message_user(request, f"{approved} words were added to obscene dict!", level=messages.INFO)
+
+    @admin.action(description="Decline selected words")
+    def decline_selected(self, request, queryset):
+        declined = obscenity_filter_service.decline_suspicious_words(queryset.values_list("id", flat=True))
+        self.message_user(request, f"{declined} words were rejected!", level=messages.INFO)
+
     def approve_view(self, request, suspiciousword_id):
-        suspicious_word = SuspiciousWord.objects.get(id=suspiciousword_id)
-        if suspicious_word.status == SuspiciousWord.SuspiciousWordStatuses.PENDING:
-            suspicious_word.status = SuspiciousWord.SuspiciousWordStatuses.ADDED
-            suspicious_word.save()
-            obscenity_filter_service.create_obscene_word(suspicious_word.value)
+        if obscenity_filter_service.approve_suspicious_words([suspiciousword_id]):
             self.message_user(request, "Word was added to obscene dict!", level=messages.INFO)
         else:
             self.message_user(request, "You can manipulate only PENDING words!", level=messages.WARNING)
         return HttpResponseRedirect(f'/admin/api/suspiciousword/')
 
     def reject_view(self, request, suspiciousword_id):
-        suspicious_word = SuspiciousWord.objects.get(id=suspiciousword_id)
-        if suspicious_word.status == SuspiciousWord.SuspiciousWordStatuses.PENDING:
-            suspicious_word.status = SuspiciousWord.SuspiciousWordStatuses.DECLINED
-            suspicious_word.save()
+        if obscenity_filter_service.decline_suspicious_words([suspiciousword_id]):
             self.message_user(request, "Word was rejected!", level=messages.INFO)
         else:
             self.message_user(request, "You can manipulate only PENDING words!", level=messages.WARNING)
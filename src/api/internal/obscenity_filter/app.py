@@ -1,17 +1,36 @@
-from openai import OpenAI
-
+from api.internal.obscenity_filter.services.backends import get_backend
+from api.internal.obscenity_filter.services.compound import CompoundDetector
+from api.internal.obscenity_filter.services.gpt_client import LazyOpenAIClient
 from api.internal.obscenity_filter.services.obscenity_filter import ObscenityFilterService
-from api.internal.obscenity_filter.transport.handlers import TextHandler
-from config.settings import CHATGPT_API_KEY, SUSPICIOUS_WORDS_CHECK, CHATGPT_BASE_URL
+from api.internal.obscenity_filter.services.prefilter import DictionaryPrefilter
+from api.internal.obscenity_filter.services.shared_cache import SharedVerdictCache
+from api.internal.obscenity_filter.transport.handlers import HealthHandler, ModerationHandler, TextHandler
+from config.settings import CHATGPT_API_KEY, SUSPICIOUS_WORDS_CHECK, CHATGPT_BASE_URL, OBSCENITY_BACKEND, \
+    OBSCENITY_PREFILTER, OBSCENITY_COMPOUND_CHECK, SHARED_VERDICT_CACHE
+
+
 
-if SUSPICIOUS_WORDS_CHECK:
-    obscenity_filter_service = ObscenityFilterService(
-        suspicious_words_check=SUSPICIOUS_WORDS_CHECK,
-        gpt_client=OpenAI(
+def create_obscenity_filter_service(backend=None, suspicious_words_check=SUSPICIOUS_WORDS_CHECK):
+    """
+    Builds the service configured by settings, so every entry point checks texts the same way.
+    """
+    return ObscenityFilterService(
+        suspicious_words_check=suspicious_words_check,
+        gpt_client=LazyOpenAIClient(
             api_key=CHATGPT_API_KEY,
             base_url=CHATGPT_BASE_URL,
-        )
+        ) if suspicious_words_check else None,
+        backend=backend or get_backend(OBSCENITY_BACKEND),
+        prefilter=DictionaryPrefilter() if OBSCENITY_PREFILTER else None,
+        compound_detector=CompoundDetector() if OBSCENITY_COMPOUND_CHECK else None,
     )
-else:
-    obscenity_filter_service = ObscenityFilterService()
-texts_handler = TextHandler(obscenity_filter_service)
+
+
+# nothing is loaded on import, the dictionary is loaded by warmup() or on first check
+obscenity_filter_service = create_obscenity_filter_service()
+texts_handler = TextHandler(
+    obscenity_filter_service,
+    shared_cache=SharedVerdictCache() if SHARED_VERDICT_CACHE else None,
+)
+health_handler = HealthHandler(obscenity_filter_service)
+moderation_handler = ModerationHandler(obscenity_filter_service)
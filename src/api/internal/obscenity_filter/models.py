@@ -1,4 +1,4 @@
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
@@ -7,6 +7,8 @@ class ObsceneWord(models.Model):
     value = models.CharField(max_length=255, unique=True, verbose_name="Word value")
     normalized_value = models.CharField(max_length=1023, verbose_name="Normalized word value")
     similarity = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(1.0)], null=True, blank=True)
+    # dictionary version which added the word, workers load words added after their version incrementally
+    version = models.BigIntegerField(default=0, db_index=True, verbose_name="Dictionary version")
 
     def __str__(self):
         return self.value
@@ -14,7 +16,30 @@ class ObsceneWord(models.Model):
     class Meta:
         verbose_name = "Obscene word"
         verbose_name_plural = "Obscene words"
-        indexes = [GinIndex(name="obscene_word_value", fields=["normalized_value"], opclasses=["gin_trgm_ops"])]
+        indexes = [
+            GinIndex(name="obscene_word_value", fields=["normalized_value"], opclasses=["gin_trgm_ops"]),
+            # "<->" distance ordering for nearest words search
+            GistIndex(name="obscene_word_value_gist", fields=["normalized_value"], opclasses=["gist_trgm_ops"]),
+        ]
+
+
+class ObsceneWordSkeleton(models.Model):
+    """
+    Canonical forms of an obscene word precomputed on write: fully folded, collapsed, digit-to-letter
+    and homoglyph folded normalized values. Input words are folded once on read and matched against them.
+    """
+
+    word = models.ForeignKey(ObsceneWord, on_delete=models.CASCADE, related_name="skeletons", verbose_name="Word")
+    value = models.CharField(max_length=1023, verbose_name="Skeleton value")
+
+    def __str__(self):
+        return self.value
+
+    class Meta:
+        verbose_name = "Obscene word skeleton"
+        verbose_name_plural = "Obscene word skeletons"
+        constraints = [models.UniqueConstraint(fields=["word", "value"], name="obscene_word_skeleton_unique")]
+        indexes = [GinIndex(name="obscene_word_skeleton_value", fields=["value"], opclasses=["gin_trgm_ops"])]
 
 
 class SuspiciousWord(models.Model):
@@ -34,3 +59,39 @@ class SuspiciousWord(models.Model):
     class Meta:
         verbose_name = "Suspicious word"
         verbose_name_plural = "Suspicious words"
+
+
+class DictionaryVersion(models.Model):
+    """
+    Single row with a counter which is incremented on every change of obscene words dictionary.
+    Workers compare it with the version of their caches to drop stale verdicts.
+    reset_version is the last version which didn't only add words: workers behind it reload their copies,
+    others add new words to them.
+    """
+
+    version = models.BigIntegerField(default=0, verbose_name="Version")
+    reset_version = models.BigIntegerField(default=0, verbose_name="Reset version")
+
+    def __str__(self):
+        return str(self.version)
+
+    class Meta:
+        verbose_name = "Dictionary version"
+        verbose_name_plural = "Dictionary versions"
+
+
+class AnalyzedText(models.Model):
+    """
+    Fingerprints of texts which were already analyzed for suspicious words with GPT.
+    """
+
+    text_hash = models.CharField(max_length=64, unique=True, verbose_name="Normalized text hash")
+    tokens_hash = models.CharField(max_length=64, db_index=True, verbose_name="Token set hash")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created at")
+
+    def __str__(self):
+        return self.text_hash
+
+    class Meta:
+        verbose_name = "Analyzed text"
+        verbose_name_plural = "Analyzed texts"
@@ -1,25 +1,96 @@
 from typing import List, Dict
 
 from ninja import NinjaAPI, Router
+from ninja.decorators import decorate_view
+from ninja.security import SessionAuthIsStaff
 
-from api.internal.obscenity_filter.transport.handlers import TextHandler
-from api.internal.obscenity_filter.transport.requests import TextIn
-from api.internal.obscenity_filter.transport.responses import ObsceneWordsOut
+from api.internal.obscenity_filter.transport.handlers import HealthHandler, limit_body_size, ModerationHandler, \
+    TextHandler
+from api.internal.obscenity_filter.transport.requests import SimilarWordsIn, SuspiciousWordsIn, TextIn, TextsIn
+from api.internal.obscenity_filter.transport.responses import CensoredTextOut, ModeratedWordsOut, ObsceneWordsOut
+from config.settings import ASYNC_API, BATCH_MAX_BODY_SIZE
 
 
 def get_texts_router(text_handler: TextHandler):
     def f(request, text_in: TextIn):
         return text_handler.check_text(request, text_in)
 
-    def k(request, text_in: TextIn):
-        return text_handler.get_similar_words(request, text_in)
+    def k(request, similar_words_in: SimilarWordsIn):
+        return text_handler.get_similar_words(request, similar_words_in)
+
+    def c(request, text_in: TextIn):
+        return text_handler.censor_text(request, text_in)
+
+    async def af(request, text_in: TextIn):
+        return await text_handler.acheck_text(request, text_in)
+
+    async def ak(request, similar_words_in: SimilarWordsIn):
+        return await text_handler.aget_similar_words(request, similar_words_in)
+
+    async def ac(request, text_in: TextIn):
+        return await text_handler.acensor_text(request, text_in)
+
+    check, similar_words, censor = (af, ak, ac) if ASYNC_API else (f, k, c)
+
+    @decorate_view(limit_body_size(BATCH_MAX_BODY_SIZE))
+    def b(request, texts_in: TextsIn):
+        return text_handler.check_texts(request, texts_in)
+
+    def cs(request, text_in: TextIn):
+        return text_handler.censor_text_stream(request, text_in)
 
     router = Router(tags=["texts"])
     router.add_api_operation(
-        "", ["POST"], f, response={200: str, 400: str}
+        "", ["POST"], check, response={200: str, 400: str}
+    )
+    router.add_api_operation(
+        "obscene-words", ["POST"], similar_words, response={200: Dict[str, List[ObsceneWordsOut]]}
+    )
+    router.add_api_operation(
+        "batch", ["POST"], b, response={413: str},
+        description="Checks many texts at once, verdicts are streamed as NDJSON lines {index, is_obscene}",
+    )
+    router.add_api_operation(
+        "censor", ["POST"], censor, response={200: CensoredTextOut},
+        description="Returns the text with obscene words masked by '*' and spans of these words",
+    )
+    router.add_api_operation(
+        "censor/stream", ["POST"], cs,
+        description="Censors a long text chunk by chunk, chunks are streamed as NDJSON lines {offset, text, spans}",
+    )
+
+    return router
+
+
+def get_health_router(health_handler: HealthHandler):
+    def ready(request):
+        return health_handler.ready(request)
+
+    router = Router(tags=["health"])
+    router.add_api_operation(
+        "ready", ["GET"], ready, response={200: str, 503: str},
+        description="Reports ready only after the service is warmed up",
+    )
+
+    return router
+
+
+def get_moderation_router(moderation_handler: ModerationHandler):
+    def approve(request, suspicious_words_in: SuspiciousWordsIn):
+        return moderation_handler.approve_words(request, suspicious_words_in)
+
+    def decline(request, suspicious_words_in: SuspiciousWordsIn):
+        return moderation_handler.decline_words(request, suspicious_words_in)
+
+    # staff users logged in to the admin panel
+    router = Router(tags=["moderation"], auth=SessionAuthIsStaff())
+    router.add_api_operation(
+        "approve", ["POST"], approve, response={200: ModeratedWordsOut},
+        description="Adds pending suspicious words to the dictionary in one transaction, returns number of added words",
     )
     router.add_api_operation(
-        "obscene-words", ["POST"], k, response={200: Dict[str, List[ObsceneWordsOut]]}
+        "decline", ["POST"], decline, response={200: ModeratedWordsOut},
+        description="Declines pending suspicious words, returns number of declined words",
     )
 
     return router
@@ -29,3 +100,13 @@ def add_texts_routers(api: NinjaAPI, text_handler: TextHandler):
     client_router = get_texts_router(text_handler)
     api.add_router("/text", client_router)
     return api
+
+
+def add_health_routers(api: NinjaAPI, health_handler: HealthHandler):
+    api.add_router("/health", get_health_router(health_handler))
+    return api
+
+
+def add_moderation_routers(api: NinjaAPI, moderation_handler: ModerationHandler):
+    api.add_router("/suspicious-words", get_moderation_router(moderation_handler))
+    return api
@@ -0,0 +1,68 @@
+from collections import deque
+from typing import Iterable, Iterator, Tuple
+
+
+class AhoCorasickAutomaton:
+    """
+    Finds all occurrences of many patterns in a text in one pass over the text.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = []
+        self._goto = [dict()]
+        self._fail = [0]
+        self._output = [None]
+        self._output_link = [0]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build_links()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def _add(self, pattern: str):
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append(dict())
+                self._fail.append(0)
+                self._output.append(None)
+                self._output_link.append(0)
+            node = next_node
+        if self._output[node] is None:
+            self._output[node] = len(self.patterns)
+            self.patterns.append(pattern)
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_node] = fail
+                # the nearest node by fail links which ends some pattern
+                self._output_link[next_node] = fail if self._output[fail] is not None else self._output_link[fail]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Yields (start, pattern_id) of every occurrence of every pattern in text.
+        """
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            output_node = node if self._output[node] is not None else self._output_link[node]
+            while output_node:
+                pattern_id = self._output[output_node]
+                yield position - len(self.patterns[pattern_id]) + 1, pattern_id
+                output_node = self._output_link[output_node]
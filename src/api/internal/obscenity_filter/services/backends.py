@@ -0,0 +1,389 @@
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from django.db import connection
+
+from api.internal.obscenity_filter.models import ObsceneWord, ObsceneWordSkeleton
+from api.internal.obscenity_filter.services.async_utils import database_sync_to_async
+from api.internal.obscenity_filter.services.dictionary_version import aget_dictionary_version, get_dictionary_version
+from api.internal.obscenity_filter.services.snapshot import DictionarySnapshot, open_snapshot
+from api.internal.obscenity_filter.services.trigrams import get_trigrams, trigram_similarity
+from config.settings import DICTIONARY_SNAPSHOT_PATH
+
+
+class SimilarWord(NamedTuple):
+    value: str
+    calc_similarity: float
+
+
+# pg_trgm.similarity_threshold default, "%" operator matches words with similarity >= this value
+PG_TRGM_SIMILARITY_THRESHOLD = 0.3
+
+
+class PostgresTrigramBackend:
+    """
+    Matching backend which calculates trigram similarity in Postgres with pg_trgm.
+    All candidates of a check are evaluated in one query: candidates are unnested from an array
+    and joined against obscene words with "%" operator, so GIN trigram index is used.
+    """
+
+    in_memory = False
+    # candidates are folded words, not variants, see SkeletonTrigramBackend
+    folds_words = False
+
+    # column which candidates are compared with
+    MATCHED_VALUE = "word.normalized_value"
+
+    @property
+    def MATCH_CONDITION(self) -> str:
+        return f"""
+            similarity({self.MATCHED_VALUE}, candidate.value) > %s
+            AND (word.similarity IS NULL OR similarity({self.MATCHED_VALUE}, candidate.value) > word.similarity)
+        """
+
+    def _get_join_condition(self, obscenity_indicator: float) -> str:
+        # "%" operator can be used as index condition only if it doesn't filter out words
+        # which are similar enough for obscenity_indicator
+        if obscenity_indicator < PG_TRGM_SIMILARITY_THRESHOLD:
+            return "TRUE"
+        return f"{self.MATCHED_VALUE} %% candidate.value"
+
+    def _get_candidates_join(self, obscenity_indicator: float) -> str:
+        return f"""
+            FROM unnest(%s::text[]) AS candidate(value)
+            JOIN {ObsceneWord._meta.db_table} AS word ON {self._get_join_condition(obscenity_indicator)}
+        """
+
+    def is_any_obscene(self, normalized_words: Sequence[str], obscenity_indicator: float) -> bool:
+        if not normalized_words:
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT EXISTS (
+                    SELECT 1
+                    {self._get_candidates_join(obscenity_indicator)}
+                    WHERE {self.MATCH_CONDITION}
+                )
+                """,
+                [list(normalized_words), obscenity_indicator],
+            )
+            return cursor.fetchone()[0]
+
+    def find_matches(self, normalized_words: Sequence[str], obscenity_indicator: float) -> Dict[str, str]:
+        """
+        Returns the most similar obscene word for every obscene candidate.
+        """
+        if not normalized_words:
+            return dict()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT DISTINCT ON (candidate.value) candidate.value, word.value
+                {self._get_candidates_join(obscenity_indicator)}
+                WHERE {self.MATCH_CONDITION}
+                ORDER BY candidate.value, similarity({self.MATCHED_VALUE}, candidate.value) DESC
+                """,
+                [list(normalized_words), obscenity_indicator],
+            )
+            return dict(cursor.fetchall())
+
+    def get_similar_words(self, normalized_words: Sequence[str], limit: int) -> Dict[str, List[SimilarWord]]:
+        """
+        Returns top limit most similar obscene words for every word.
+        All words are evaluated in one query, nearest words are found by GiST trigram index with "<->" distance.
+        """
+        if not normalized_words:
+            return dict()
+        similar_words = {normalized_word: [] for normalized_word in normalized_words}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT candidate.value, word.value, similarity(word.normalized_value, candidate.value)
+                FROM unnest(%s::text[]) WITH ORDINALITY AS candidate(value, position)
+                CROSS JOIN LATERAL (
+                    SELECT value, normalized_value
+                    FROM {ObsceneWord._meta.db_table}
+                    ORDER BY normalized_value <-> candidate.value
+                    LIMIT %s
+                ) AS word
+                ORDER BY candidate.position, word.normalized_value <-> candidate.value
+                """,
+                [list(similar_words), limit],
+            )
+            for normalized_word, value, calc_similarity in cursor.fetchall():
+                similar_words[normalized_word].append(SimilarWord(value, calc_similarity))
+        return similar_words
+
+    async def ais_any_obscene(self, normalized_words: Sequence[str], obscenity_indicator: float) -> bool:
+        if not normalized_words:
+            return False
+        return await database_sync_to_async(self.is_any_obscene)(normalized_words, obscenity_indicator)
+
+    async def afind_matches(self, normalized_words: Sequence[str], obscenity_indicator: float) -> Dict[str, str]:
+        if not normalized_words:
+            return dict()
+        return await database_sync_to_async(self.find_matches)(normalized_words, obscenity_indicator)
+
+    async def aget_similar_words(self, normalized_words: Sequence[str], limit: int) -> Dict[str, List[SimilarWord]]:
+        if not normalized_words:
+            return dict()
+        return await database_sync_to_async(self.get_similar_words)(normalized_words, limit)
+
+    def invalidate(self):
+        pass
+
+    def add_entries(self, entries: Iterable[Tuple[str, str, Optional[float]]]):
+        pass
+
+
+class SkeletonTrigramBackend(PostgresTrigramBackend):
+    """
+    Matching backend which compares folded words with skeletons of obscene words precomputed on write,
+    so a word is folded once and looked up once instead of looking up every transformation variant.
+    """
+
+    folds_words = True
+
+    MATCHED_VALUE = "skeleton.value"
+
+    def _get_candidates_join(self, obscenity_indicator: float) -> str:
+        return f"""
+            FROM unnest(%s::text[]) AS candidate(value)
+            JOIN {ObsceneWordSkeleton._meta.db_table} AS skeleton ON {self._get_join_condition(obscenity_indicator)}
+            JOIN {ObsceneWord._meta.db_table} AS word ON word.id = skeleton.word_id
+        """
+
+
+class TrigramIndex:
+    """
+    Inverted index from pg_trgm-compatible trigrams to dictionary entries.
+    Entries are only appended and postings are extended last, so an entry is added while other threads search.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.thresholds = []
+        self.trigram_counts = []
+        self.postings = dict()
+        self._known_values = set()
+
+    def add(self, value: str, normalized_value: str, threshold: Optional[float]):
+        """
+        Adds an entry, an entry with a known value is skipped.
+        """
+        if value in self._known_values:
+            return
+        self._known_values.add(value)
+        entry_id = len(self.values)
+        trigrams = get_trigrams(normalized_value)
+        self.values.append(value)
+        self.thresholds.append(threshold)
+        self.trigram_counts.append(len(trigrams))
+        for trigram in trigrams:
+            self.postings.setdefault(trigram, []).append(entry_id)
+
+    def __len__(self):
+        return len(self.values)
+
+    def similarities(self, normalized_word: str) -> dict:
+        """
+        Returns similarity to every entry which has at least one common trigram with normalized_word.
+        """
+        trigrams = get_trigrams(normalized_word)
+        common_counts = Counter()
+        for trigram in trigrams:
+            common_counts.update(self.postings.get(trigram, ()))
+        return {
+            entry_id: trigram_similarity(common_count, len(trigrams), self.trigram_counts[entry_id])
+            for entry_id, common_count in common_counts.items()
+        }
+
+
+class _Concatenated:
+    def __init__(self, first: Sequence, second: Sequence):
+        self._first = first
+        self._second = second
+
+    def __len__(self):
+        return len(self._first) + len(self._second)
+
+    def __getitem__(self, entry_id: int):
+        if entry_id < len(self._first):
+            return self._first[entry_id]
+        return self._second[entry_id - len(self._first)]
+
+
+class LayeredIndex:
+    """
+    Read-only index (a mapped snapshot) with a small TrigramIndex of words added after it was loaded,
+    entry ids of added words follow entry ids of the read-only index.
+    """
+
+    def __init__(self, base: DictionarySnapshot):
+        self.base = base
+        self.added = TrigramIndex()
+        self.values = _Concatenated(base.values, self.added.values)
+        self.thresholds = _Concatenated(base.thresholds, self.added.thresholds)
+        self.trigram_counts = _Concatenated(base.trigram_counts, self.added.trigram_counts)
+
+    def add(self, value: str, normalized_value: str, threshold: Optional[float]):
+        self.added.add(value, normalized_value, threshold)
+
+    def __len__(self):
+        return len(self.base) + len(self.added)
+
+    def similarities(self, normalized_word: str) -> dict:
+        similarities = self.base.similarities(normalized_word)
+        offset = len(self.base)
+        for entry_id, calc_similarity in self.added.similarities(normalized_word).items():
+            similarities[offset + entry_id] = calc_similarity
+        return similarities
+
+
+class InMemoryTrigramBackend:
+    """
+    Matching backend which keeps all obscene words in an in-memory trigram index
+    and calculates pg_trgm-compatible similarity locally, so checks don't query the database.
+
+    The index is loaded lazily on first use and reloaded after invalidate(), added words are added to it in place.
+    If a snapshot of the current dictionary version is built by build_dictionary_snapshot,
+    it is memory-mapped instead of reading all words from the database, added words are kept next to it.
+    """
+
+    in_memory = True
+    folds_words = False
+
+    def __init__(self, snapshot_path=DICTIONARY_SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _get_entries(self):
+        return ObsceneWord.objects.values_list("value", "normalized_value", "similarity")
+
+    def load(self) -> Union[TrigramIndex, DictionarySnapshot, LayeredIndex]:
+        index = open_snapshot(self.snapshot_path, get_dictionary_version()) if self.snapshot_path else None
+        if index is None:
+            index = TrigramIndex()
+            for value, normalized_value, threshold in self._get_entries().iterator():
+                index.add(value, normalized_value, threshold)
+        self._index = index
+        return index
+
+    async def aload(self) -> Union[TrigramIndex, DictionarySnapshot, LayeredIndex]:
+        index = open_snapshot(self.snapshot_path, await aget_dictionary_version()) if self.snapshot_path else None
+        if index is None:
+            index = TrigramIndex()
+            async for value, normalized_value, threshold in self._get_entries():
+                index.add(value, normalized_value, threshold)
+        self._index = index
+        return index
+
+    def get_index(self) -> Union[TrigramIndex, DictionarySnapshot, LayeredIndex]:
+        if self._index is None:
+            return self.load()
+        return self._index
+
+    async def aget_index(self) -> Union[TrigramIndex, DictionarySnapshot, LayeredIndex]:
+        if self._index is None:
+            return await self.aload()
+        return self._index
+
+    def invalidate(self):
+        self._index = None
+
+    def add_entries(self, entries: Iterable[Tuple[str, str, Optional[float]]]):
+        """
+        Adds (value, normalized_value, similarity threshold) of added words to the loaded index.
+        """
+        with self._lock:
+            index = self._index
+            if index is None:
+                return
+            if isinstance(index, DictionarySnapshot):
+                # a mapped snapshot is read-only, it is merged with added words by the next reload
+                index = self._index = LayeredIndex(index)
+            for value, normalized_value, threshold in entries:
+                index.add(value, normalized_value, threshold)
+
+    def _find_match(self, index: TrigramIndex, normalized_word: str, obscenity_indicator: float) -> Optional[str]:
+        match, match_similarity = None, 0.0
+        for entry_id, calc_similarity in index.similarities(normalized_word).items():
+            threshold = index.thresholds[entry_id]
+            if (
+                calc_similarity > obscenity_indicator
+                and (threshold is None or calc_similarity > threshold)
+                and calc_similarity > match_similarity
+            ):
+                match, match_similarity = index.values[entry_id], calc_similarity
+        return match
+
+    def is_any_obscene(self, normalized_words: Sequence[str], obscenity_indicator: float) -> bool:
+        index = self.get_index()
+        return any(
+            self._find_match(index, normalized_word, obscenity_indicator) is not None
+            for normalized_word in normalized_words
+        )
+
+    def find_matches(self, normalized_words: Sequence[str], obscenity_indicator: float) -> Dict[str, str]:
+        """
+        Returns the most similar obscene word for every obscene candidate.
+        """
+        index = self.get_index()
+        matches = dict()
+        for normalized_word in normalized_words:
+            match = self._find_match(index, normalized_word, obscenity_indicator)
+            if match is not None:
+                matches[normalized_word] = match
+        return matches
+
+    async def ais_any_obscene(self, normalized_words: Sequence[str], obscenity_indicator: float) -> bool:
+        await self.aget_index()
+        return self.is_any_obscene(normalized_words, obscenity_indicator)
+
+    async def afind_matches(self, normalized_words: Sequence[str], obscenity_indicator: float) -> Dict[str, str]:
+        await self.aget_index()
+        return self.find_matches(normalized_words, obscenity_indicator)
+
+    def _get_similar_words(self, index: TrigramIndex, normalized_word: str, limit: int) -> List[SimilarWord]:
+        similarities = index.similarities(normalized_word)
+        similar_words = [
+            SimilarWord(index.values[entry_id], calc_similarity)
+            for entry_id, calc_similarity in sorted(similarities.items(), key=lambda item: -item[1])[0:limit]
+        ]
+        # Postgres returns words without common trigrams too, their similarity is 0
+        for entry_id in range(len(index)):
+            if len(similar_words) >= limit:
+                break
+            if entry_id not in similarities:
+                similar_words.append(SimilarWord(index.values[entry_id], 0.0))
+        return similar_words
+
+    def get_similar_words(self, normalized_words: Sequence[str], limit: int) -> Dict[str, List[SimilarWord]]:
+        """
+        Returns top limit most similar obscene words for every word.
+        """
+        index = self.get_index()
+        return {
+            normalized_word: self._get_similar_words(index, normalized_word, limit)
+            for normalized_word in normalized_words
+        }
+
+    async def aget_similar_words(self, normalized_words: Sequence[str], limit: int) -> Dict[str, List[SimilarWord]]:
+        await self.aget_index()
+        return self.get_similar_words(normalized_words, limit)
+
+
+BACKENDS = {
+    "postgres": PostgresTrigramBackend,
+    "memory": InMemoryTrigramBackend,
+    "skeleton": SkeletonTrigramBackend,
+}
+
+
+def get_backend(name: str):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown obscenity backend {name!r}, choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,138 @@
+import threading
+from bisect import bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from asgiref.sync import sync_to_async
+
+from api.internal.obscenity_filter.models import ObsceneWord
+from api.internal.obscenity_filter.services.aho_corasick import AhoCorasickAutomaton
+from api.internal.obscenity_filter.services.dictionary_version import get_dictionary_version
+from api.internal.obscenity_filter.services.snapshot import open_snapshot
+from api.internal.obscenity_filter.services.trigrams import similarity
+from config.settings import COMPOUND_MIN_LENGTH, DICTIONARY_SNAPSHOT_PATH
+
+
+class CompoundDictionary(NamedTuple):
+    automaton: AhoCorasickAutomaton
+    # (value, similarity threshold) of obscene words of every pattern of the automaton
+    pattern_entries: List[List[Tuple[str, Optional[float]]]]
+
+
+class CompoundDetector:
+    """
+    Finds obscene words glued into longer words ("superbanan") or split across several words ("b a n a n").
+
+    Normalized words of a text are concatenated without separators and scanned once
+    by Aho-Corasick automaton over normalized obscene words, so cost is linear in text length
+    instead of checking every window of words.
+    A hit inside one word is a glued obscene word. A hit which covers several words must start at the beginning
+    of its first word and end at the end of its last word, otherwise it is made of parts of neighbour words.
+    Obscene words shorter than min_length are too common parts of normal words and are not searched.
+    A word with its own similarity threshold is found only if similarity of the hit words to it is above the threshold.
+
+    The dictionary is loaded lazily on first use and reloaded after invalidate(),
+    from the dictionary snapshot if it is fresh. Added words are kept in a small dictionary next to the loaded one,
+    only it is rebuilt on addition, both are merged by the next reload.
+    New dictionaries are built aside and replace the old ones at once, so other threads search with one of them.
+    """
+
+    def __init__(self, min_length=COMPOUND_MIN_LENGTH, snapshot_path=DICTIONARY_SNAPSHOT_PATH):
+        self.min_length = min_length
+        self.snapshot_path = snapshot_path
+        # the loaded dictionary and the dictionary of added words if any
+        self._dictionaries: Optional[Tuple[CompoundDictionary, ...]] = None
+        # loads and additions replace dictionaries one by one, so an addition isn't lost
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._dictionaries = None
+
+    def load_entries(self, entries: Iterable[Tuple[str, str, Optional[float]]]) -> Tuple[CompoundDictionary, ...]:
+        """
+        Builds the automaton by (value, normalized_value, similarity threshold) of obscene words.
+        """
+        dictionaries = (self._build(dict(), entries),)
+        with self._lock:
+            self._dictionaries = dictionaries
+        return dictionaries
+
+    def add_entries(self, entries: Iterable[Tuple[str, str, Optional[float]]]):
+        """
+        Adds (value, normalized_value, similarity threshold) of added words to the loaded dictionary
+        without reading it from the database again.
+        """
+        with self._lock:
+            if self._dictionaries is None:
+                return
+            dictionary, *added_dictionaries = self._dictionaries
+            pattern_entries = dict()
+            for added in added_dictionaries:
+                pattern_entries.update(zip(added.automaton.patterns, map(list, added.pattern_entries)))
+            self._dictionaries = (dictionary, self._build(pattern_entries, entries))
+
+    def _build(
+            self,
+            pattern_entries: Dict[str, List[Tuple[str, Optional[float]]]],
+            entries: Iterable[Tuple[str, str, Optional[float]]],
+    ) -> CompoundDictionary:
+        for value, normalized_value, threshold in entries:
+            if len(normalized_value) >= self.min_length:
+                pattern_entries.setdefault(normalized_value, []).append((value, threshold))
+        automaton = AhoCorasickAutomaton(pattern_entries)
+        return CompoundDictionary(automaton, [pattern_entries[pattern] for pattern in automaton.patterns])
+
+    def load(self) -> Tuple[CompoundDictionary, ...]:
+        snapshot = open_snapshot(self.snapshot_path, get_dictionary_version()) if self.snapshot_path else None
+        if snapshot is not None:
+            return self.load_entries(snapshot.iter_entries())
+        return self.load_entries(ObsceneWord.objects.values_list("value", "normalized_value", "similarity").iterator())
+
+    async def aload(self):
+        if self._dictionaries is None:
+            await sync_to_async(self.load)()
+
+    def _get_match(
+            self, pattern: str, entries: List[Tuple[str, Optional[float]]], hit_words: Sequence[str]
+    ) -> Optional[str]:
+        calc_similarity = None
+        for value, threshold in entries:
+            if threshold is None:
+                return value
+            # the whole words are compared, a word with a high threshold isn't found inside a longer word
+            if calc_similarity is None:
+                calc_similarity = similarity("".join(hit_words), pattern)
+            if calc_similarity > threshold:
+                return value
+        return None
+
+    def find(self, normalized_words: Sequence[str]) -> List[Tuple[int, int, str]]:
+        """
+        Returns (first word index, last word index, obscene word) of every hit in a sequence of normalized words.
+        """
+        dictionaries = self._dictionaries
+        if dictionaries is None:
+            dictionaries = self.load()
+        starts = []
+        position = 0
+        for normalized_word in normalized_words:
+            starts.append(position)
+            position += len(normalized_word)
+
+        text = "".join(normalized_words)
+        hits = []
+        for dictionary in dictionaries:
+            for start, pattern_id in dictionary.automaton.iter_matches(text):
+                end = start + len(dictionary.automaton.patterns[pattern_id])
+                # empty words have the same start as the next word, the last one of them is taken
+                first, last = bisect_right(starts, start) - 1, bisect_right(starts, end - 1) - 1
+                if first != last and (start != starts[first] or end != starts[last] + len(normalized_words[last])):
+                    continue
+                match = self._get_match(
+                    dictionary.automaton.patterns[pattern_id],
+                    dictionary.pattern_entries[pattern_id],
+                    normalized_words[first:last + 1],
+                )
+                if match is not None:
+                    hits.append((first, last, match))
+        return hits
@@ -0,0 +1,85 @@
+from typing import List, Optional, Tuple
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from api.internal.obscenity_filter.models import DictionaryVersion, ObsceneWord
+from config.settings import SHARED_VERDICT_CACHE, SHARED_VERDICT_CACHE_ALIAS
+
+DICTIONARY_VERSION_ID = 1
+# dictionary version cached by SharedVerdictCache
+SHARED_DICTIONARY_VERSION_KEY = "obscenity:dictionary_version"
+
+
+def get_dictionary_version() -> int:
+    """
+    Returns current version of obscene words dictionary, it is shared by all workers through the database.
+    """
+    version = DictionaryVersion.objects.filter(pk=DICTIONARY_VERSION_ID).values_list("version", flat=True).first()
+    return version or 0
+
+
+async def aget_dictionary_version() -> int:
+    version = await DictionaryVersion.objects.filter(
+        pk=DICTIONARY_VERSION_ID
+    ).values_list("version", flat=True).afirst()
+    return version or 0
+
+
+def get_dictionary_versions() -> Tuple[int, int]:
+    """
+    Returns current version of the dictionary and the last version which didn't only add words.
+    """
+    versions = DictionaryVersion.objects.filter(
+        pk=DICTIONARY_VERSION_ID
+    ).values_list("version", "reset_version").first()
+    return versions or (0, 0)
+
+
+async def aget_dictionary_versions() -> Tuple[int, int]:
+    versions = await DictionaryVersion.objects.filter(
+        pk=DICTIONARY_VERSION_ID
+    ).values_list("version", "reset_version").afirst()
+    return versions or (0, 0)
+
+
+def _get_added_words(since_version: int, version: int):
+    return ObsceneWord.objects.filter(
+        version__gt=since_version, version__lte=version
+    ).values_list("value", "normalized_value", "similarity")
+
+
+def get_added_entries(since_version: int, version: int) -> List[Tuple[str, str, Optional[float]]]:
+    """
+    Returns (value, normalized_value, similarity threshold) of words added after since_version up to version.
+    """
+    return list(_get_added_words(since_version, version))
+
+
+async def aget_added_entries(since_version: int, version: int) -> List[Tuple[str, str, Optional[float]]]:
+    return [entry async for entry in _get_added_words(since_version, version)]
+
+
+def bump_dictionary_version(reset=True) -> int:
+    """
+    Increments version of obscene words dictionary, so all workers drop their cached verdicts.
+    If reset is False, the change only adds words with the returned version: workers add them
+    to their dictionary copies and keep obscene verdicts instead of reloading everything.
+    """
+    fields = {"version": F("version") + 1}
+    if reset:
+        # SET reads the old version, so reset_version becomes the new version
+        fields["reset_version"] = F("version") + 1
+    updated = DictionaryVersion.objects.filter(pk=DICTIONARY_VERSION_ID).update(**fields)
+    if updated:
+        version = DictionaryVersion.objects.filter(pk=DICTIONARY_VERSION_ID).values_list("version", flat=True).get()
+    else:
+        dictionary_version, _ = DictionaryVersion.objects.get_or_create(
+            pk=DICTIONARY_VERSION_ID, defaults={"version": 1, "reset_version": 1}
+        )
+        version = dictionary_version.version
+    if SHARED_VERDICT_CACHE:
+        # shared verdicts of the old version are not read after the new version is visible to other workers
+        transaction.on_commit(lambda: caches[SHARED_VERDICT_CACHE_ALIAS].delete(SHARED_DICTIONARY_VERSION_KEY))
+    return version
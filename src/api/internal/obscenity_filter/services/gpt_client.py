@@ -0,0 +1,29 @@
+import threading
+
+
+class LazyOpenAIClient:
+    """
+    OpenAI client which is created on first use, so importing the app doesn't import openai,
+    and a client with its connection pool is never created in gunicorn master and shared with forked workers.
+    """
+
+    def __init__(self, **client_kwargs):
+        self._client_kwargs = client_kwargs
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_created(self) -> bool:
+        return self._client is not None
+
+    def get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+
+                    self._client = OpenAI(**self._client_kwargs)
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
@@ -0,0 +1,19 @@
+import csv
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+
+def read_csv_words(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Streams non-empty cells of a csv file, every cell is an obscene word.
+    """
+    for row in csv.reader(lines):
+        for word in row:
+            if word.strip():
+                yield word
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import METRICS_DIR, METRICS_ENABLED, METRICS_FLUSH_INTERVAL
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 10000)
+
+HISTOGRAMS = {
+    "obscenity_stage_seconds": ("Time spent in a stage of obscenity check", SECONDS_BUCKETS),
+    "obscenity_request_seconds": ("Time spent on a request", SECONDS_BUCKETS),
+    "obscenity_request_db_queries": ("Database queries made by a request", COUNT_BUCKETS),
+    "obscenity_text_tokens": ("Tokens in a checked text", COUNT_BUCKETS),
+}
+COUNTERS = {
+    "obscenity_llm_tokens_total": "Tokens used by LLM requests",
+    "obscenity_suspicious_texts_total": "Clean texts submitted for suspicious words search by result",
+}
+
+NULL_TIMER = nullcontext()
+# values of exited processes are summed to this file, so counters don't go down when gunicorn restarts workers
+DEAD_PROCESSES_FILE = "metrics_dead.json"
+
+# queries made in the current request, the context is copied to threads of sync_to_async too
+request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+
+class Timer:
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.started_at, **self.labels)
+
+
+class MetricsRegistry:
+    """
+    Prometheus-style histograms and counters of the current process.
+
+    Every process writes its values to its own file in directory from time to time,
+    render() sums files of all processes, so gunicorn workers are aggregated like in prometheus_client
+    multiprocess mode. When disabled, timers are shared no-op context managers, so hot path overhead is negligible.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.enabled = enabled
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._histograms: Dict[Tuple[str, tuple], list] = dict()
+        self._counters: Dict[Tuple[str, tuple], float] = dict()
+        self._flushed_at = time.monotonic()
+
+    def _check_fork(self):
+        # values observed before fork belong to the parent process
+        if self._pid != os.getpid():
+            self._reset()
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            # bucket counts are not cumulative here, they are accumulated on render
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+            position = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            values[position] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def timer(self, name: str, **labels):
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, labels)
+
+    def stage(self, stage: str):
+        """
+        Measures time of a stage of obscenity check.
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, "obscenity_stage_seconds", {"stage": stage})
+
+    def _get_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics_{pid}.json")
+
+    def _dump(self) -> dict:
+        with self._lock:
+            self._check_fork()
+            return to_dump(self._histograms, self._counters)
+
+    def flush(self):
+        if not self.enabled or not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        write_dump(self._get_path(os.getpid()), self._dump())
+        self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        if self.enabled and self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def _load_dumps(self) -> List[dict]:
+        if not self.directory:
+            return [self._dump()]
+        self.flush()
+        dumps = []
+        for file_name in sorted(os.listdir(self.directory)):
+            if file_name.startswith("metrics_") and file_name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, file_name)) as metrics_file:
+                        dumps.append(json.load(metrics_file))
+                except (OSError, ValueError):
+                    # the file of a worker which is writing it right now or died while writing
+                    continue
+        return dumps
+
+    def mark_process_dead(self, pid: int):
+        """
+        Adds values of an exited process to totals of dead processes and removes its file.
+        """
+        if not self.enabled or not self.directory:
+            return
+        path = self._get_path(pid)
+        dead_path = os.path.join(self.directory, DEAD_PROCESSES_FILE)
+        dumps = []
+        for dump_path in (dead_path, path):
+            try:
+                with open(dump_path) as metrics_file:
+                    dumps.append(json.load(metrics_file))
+            except (OSError, ValueError):
+                continue
+        if os.path.exists(path):
+            write_dump(dead_path, to_dump(*merge_dumps(dumps)))
+            os.remove(path)
+
+    def collect(self) -> Tuple[dict, dict]:
+        """
+        Returns histograms and counters summed over all processes.
+        """
+        return merge_dumps(self._load_dumps())
+
+    def render(self) -> str:
+        """
+        Returns metrics in Prometheus text exposition format.
+        """
+        histograms, counters = self.collect()
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric_name, labels), values in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip([*buckets, "+Inf"], values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {values[-2]}")
+                lines.append(f"{name}_count{format_labels(labels)} {values[-1]}")
+        for name, help_text in COUNTERS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric_name, labels), value in sorted(counters.items()):
+                if metric_name == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def to_dump(histograms: dict, counters: dict) -> dict:
+    return {
+        "histograms": [[name, dict(labels), list(values)] for (name, labels), values in histograms.items()],
+        "counters": [[name, dict(labels), value] for (name, labels), value in counters.items()],
+    }
+
+
+def write_dump(path: str, dump: dict):
+    # the file is replaced at once, so readers never see a partly written file
+    with open(f"{path}.tmp", "w") as metrics_file:
+        json.dump(dump, metrics_file)
+    os.replace(f"{path}.tmp", path)
+
+
+def merge_dumps(dumps: List[dict]) -> Tuple[dict, dict]:
+    histograms = dict()
+    counters = dict()
+    for dump in dumps:
+        for name, labels, values in dump["histograms"]:
+            key = (name, tuple(sorted(labels.items())))
+            if key in histograms:
+                histograms[key] = [total + value for total, value in zip(histograms[key], values)]
+            else:
+                histograms[key] = values
+        for name, labels, value in dump["counters"]:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def format_labels(labels: tuple, **extra_labels) -> str:
+    items = [*labels, *extra_labels.items()]
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+
+metrics = MetricsRegistry()
@@ -1,11 +1,48 @@
+import logging
 import re
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
 
-from django.contrib.postgres.search import TrigramSimilarity
-from django.db.models import F, Q
+from django.db import transaction
 
-from api.internal.obscenity_filter.models import ObsceneWord, SuspiciousWord
-from api.internal.obscenity_filter.services.transfromations import DEFAULT_TRANSFORMATIONS
-from config.settings import OBSCENITY_INDICATOR
+from api.internal.obscenity_filter.models import ObsceneWord, ObsceneWordSkeleton, SuspiciousWord
+from api.internal.obscenity_filter.services.backends import PostgresTrigramBackend
+from api.internal.obscenity_filter.services.suspicious_words import SuspiciousWordsCollector
+from api.internal.obscenity_filter.services.importer import chunked
+from api.internal.obscenity_filter.services.metrics import metrics
+from api.internal.obscenity_filter.services.dictionary_version import aget_added_entries, \
+    aget_dictionary_versions, bump_dictionary_version, get_added_entries, get_dictionary_versions
+from api.internal.obscenity_filter.services.tokenizer import split_text, Token, tokenize
+from api.internal.obscenity_filter.services.transfromations import DEFAULT_TRANSFORMATIONS, fold_word, \
+    get_skeletons, TransformationPipeline
+from api.internal.obscenity_filter.services.verdict_cache import MISSING, VerdictCache
+from config.settings import CENSOR_STREAM_CHUNK_SIZE, IMPORT_CHUNK_SIZE, MAX_TRANSFORMATION_CHAIN, \
+    OBSCENITY_INDICATOR, VARIANT_BUDGET, VERDICT_CACHE_SIZE, VERDICT_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class ObsceneSpan(NamedTuple):
+    start: int
+    end: int
+    word: str
+    match: str
+
+
+class TextAnalysis(NamedTuple):
+    is_obscene: bool
+    spans: List[ObsceneSpan]
+
+
+class CensoredText(NamedTuple):
+    offset: int
+    text: str
+    spans: List[ObsceneSpan]
+
+
+class ImportResult(NamedTuple):
+    imported: int
+    # words longer than ObsceneWord.value can store
+    skipped: int
 
 
 class ObscenityFilterService:
@@ -21,10 +58,21 @@ class ObscenityFilterService:
     Process of defining an obscene word:
     1. Transform word to other words based on assumptions, how characters or group of symbols might appear similar to symbols used in obscene word.
        For example: app1e is similar to apple, ccaatt is similar to cat
+       Transformations are also composed: aapp1e is similar to apple too.
        !!! You can add more transformations to make filter more robust.
     2. Normalize initial and transformed words
        For example: " ЯблОkо" -> "yabloko"
     3. Find most similar words by trigrams and check if similarity is more than obscenity_indicator
+       Similarity is calculated by matching backend: in Postgres (default) or in an in-memory trigram index.
+       Optional prefilter resolves exact hits and hopeless candidates before the backend.
+    4. Optionally find obscene words glued into other words or split by spaces with compound detector.
+
+    Texts are split to words by the tokenizer, every distinct word is checked once per text.
+
+    Verdicts for words and their normalized variants are cached until the dictionary version changes.
+    The version is stored in the database, so a dictionary change made by any worker is seen by all workers.
+    When words were only added, workers add them to their in-memory copies and keep obscene verdicts,
+    other changes drop all cached verdicts and copies.
     """
 
     TRANSLATION_DICT = {
@@ -62,22 +110,80 @@ class ObscenityFilterService:
         "я": "ya",
         "ё": "e",
     }
-
+    TRANSLATION_TABLE = str.maketrans(TRANSLATION_DICT)
+    MASK_CHARACTER = "*"
+    NON_WORD_RE = re.compile(r"[^\w\dа-яА-ЯёЁ]", flags=re.UNICODE)
+    # exercises tokenization, normalization and transformation tables of both scripts
+    WARMUP_TEXT = "Warmup: проверка 0123456789"
 
     def __init__(
             self,
             *,
             obscenity_indicator=OBSCENITY_INDICATOR,
             transformations=DEFAULT_TRANSFORMATIONS,
+            max_transformation_chain=MAX_TRANSFORMATION_CHAIN,
+            variant_budget=VARIANT_BUDGET,
             suspicious_words_check=False,
             gpt_client=None,
+            suspicious_words_collector=None,
+            backend=None,
+            prefilter=None,
+            compound_detector=None,
+            verdict_cache_size=VERDICT_CACHE_SIZE,
+            verdict_cache_ttl=VERDICT_CACHE_TTL,
     ):
         self.obscenity_indicator = obscenity_indicator
+        self.backend = backend or PostgresTrigramBackend()
+        if self.backend.folds_words and prefilter is not None:
+            raise ValueError("prefilter matches variants of words, it can't be used with a backend which folds words")
+        self.prefilter = prefilter
+        self.compound_detector = compound_detector
+        self.verdict_cache_size = verdict_cache_size
+        self.word_cache = VerdictCache(verdict_cache_size, verdict_cache_ttl)
+        self.variant_cache = VerdictCache(verdict_cache_size, verdict_cache_ttl)
+        self._dictionary_version = None
         self.transformations = transformations
+        self.pipeline = TransformationPipeline(
+            transformations, self.normalize_word, max_transformation_chain, variant_budget
+        )
         self.suspicious_words_check = suspicious_words_check
-        if self.suspicious_words_check and not gpt_client:
+        if self.suspicious_words_check and not gpt_client and not suspicious_words_collector:
             raise ValueError("gpt_client must be defined too if suspicious_words_check is True")
         self.gpt_client = gpt_client
+        if self.suspicious_words_check and not suspicious_words_collector:
+            suspicious_words_collector = SuspiciousWordsCollector(gpt_client, self.normalize_word)
+        self.suspicious_words_collector = suspicious_words_collector
+        self.is_warmed_up = False
+
+    def warmup(self):
+        """
+        Loads everything the first check needs: dictionary version, in-memory dictionary copies
+        and transformation tables. It is called in gunicorn master before fork,
+        so workers share loaded data copy-on-write instead of loading it on their first requests.
+        """
+        self.sync_dictionary_version()
+        if self.backend.in_memory:
+            self.backend.get_index()
+        if self.prefilter is not None:
+            self.prefilter.load()
+        if self.compound_detector is not None:
+            self.compound_detector.load()
+        for token in tokenize(self.WARMUP_TEXT):
+            self.get_word_variants(token.value)
+            self.fold_word(token.value)
+        self.is_warmed_up = True
+
+    def try_warmup(self) -> bool:
+        """
+        Warms the service up if the database is available. A failed warmup is logged and leaves the service
+        not warmed up, everything is loaded on first use then and warmup is retried by readiness probe.
+        """
+        try:
+            self.warmup()
+        except Exception:
+            logger.exception("Failed to warm up obscenity filter")
+            return False
+        return True
 
     def normalize_word(self, word: str) -> str:
         """
@@ -87,76 +193,519 @@ class ObscenityFilterService:
         - Trims leading and trailing whitespace.
         - Transliterates Cyrillic letters to Latin equivalents.
         """
-        filtered_word = re.sub(r"[^\w\dа-яА-ЯёЁ]", "", word, flags=re.UNICODE)
+        filtered_word = self.NON_WORD_RE.sub("", word)
         lowered_word = filtered_word.lower()
         stripped_word = lowered_word.strip()
-        translated_word = stripped_word.translate(str.maketrans(self.TRANSLATION_DICT))
+        translated_word = stripped_word.translate(self.TRANSLATION_TABLE)
         return translated_word
 
     def normalize_text(self, text: str) -> str:
-        return " ".join(map(self.normalize_word, text.split(" ")))
+        return " ".join(self.normalize_word(token.value) for token in tokenize(text))
 
     def _add_suspicious_words(self, text: str):
-        # TODO: add async here
-        completion = self.gpt_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "user", "content": "Find words in the text that may be obscene"
-                                            "Print ONLY found words separated by spaces without explanations"},
-                {"role": "user", "content": text},
-            ],
-            temperature=0,
-            top_p=1,
-        )
-        suspicious_words = completion.choices[0].message.content
-        SuspiciousWord.objects.bulk_create(
-            [SuspiciousWord(value=word) for word in suspicious_words.split(' ')],
-            ignore_conflicts=True,
-        )
+        self.suspicious_words_collector.submit(text)
+
+    def _is_incremental_update(self, version: int, reset_version: int) -> bool:
+        """
+        Returns True if only words were added to the dictionary since the version of this worker.
+        """
+        return self._dictionary_version is not None and reset_version <= self._dictionary_version < version
+
+    def _update_dictionary_version(self, version: int, added_entries=None):
+        if version == self._dictionary_version:
+            return
+        if added_entries is not None:
+            self._add_dictionary_entries(added_entries)
+            # added words don't make obscene words clean, only clean verdicts may be stale
+            self.word_cache.retain(version, lambda match: match is not None)
+            self.variant_cache.retain(version, lambda match: match is not None)
+        else:
+            if self._dictionary_version is not None:
+                self._invalidate_dictionary_copies()
+            self.word_cache.sync_version(version)
+            self.variant_cache.sync_version(version)
+        self._dictionary_version = version
 
-    def _similarity_obscene_check(self, similarity: TrigramSimilarity) -> bool:
-        similar_words = ObsceneWord.objects.annotate(
-            calc_similarity=similarity
-        ).filter(
-            Q(calc_similarity__gt=self.obscenity_indicator)
-            & (Q(similarity__isnull=True) | Q(calc_similarity__gt=F("similarity")))
+    def _is_dictionary_version_needed(self) -> bool:
+        return (
+            bool(self.verdict_cache_size)
+            or self.backend.in_memory
+            or self.prefilter is not None
+            or self.compound_detector is not None
         )
-        return similar_words.count() > 0
+
+    def _invalidate_dictionary_copies(self):
+        self.backend.invalidate()
+        if self.prefilter is not None:
+            self.prefilter.invalidate()
+        if self.compound_detector is not None:
+            self.compound_detector.invalidate()
+
+    def _add_dictionary_entries(self, entries):
+        self.backend.add_entries(entries)
+        if self.prefilter is not None:
+            self.prefilter.add_entries(entries)
+        if self.compound_detector is not None:
+            self.compound_detector.add_entries(entries)
+
+    def sync_dictionary_version(self):
+        """
+        Drops cached verdicts and in-memory dictionary copy if the dictionary was changed by any worker.
+        If words were only added, they are read and added to the copy instead.
+        """
+        if self._is_dictionary_version_needed():
+            with metrics.stage("dictionary_version"):
+                version, reset_version = get_dictionary_versions()
+                added_entries = None
+                if self._is_incremental_update(version, reset_version):
+                    added_entries = get_added_entries(self._dictionary_version, version)
+                self._update_dictionary_version(version, added_entries)
+
+    async def async_dictionary_version(self):
+        if self._is_dictionary_version_needed():
+            with metrics.stage("dictionary_version"):
+                version, reset_version = await aget_dictionary_versions()
+                added_entries = None
+                if self._is_incremental_update(version, reset_version):
+                    added_entries = await aget_added_entries(self._dictionary_version, version)
+                self._update_dictionary_version(version, added_entries)
+
+    def dictionary_changed(self):
+        """
+        Must be called after every change of obscene words dictionary.
+        """
+        bump_dictionary_version()
+        self.word_cache.clear()
+        self.variant_cache.clear()
+        self._invalidate_dictionary_copies()
+        self._dictionary_version = None
+
+    def _tokenize(self, text: str) -> List[Token]:
+        with metrics.stage("tokenize"):
+            tokens = tokenize(text)
+        metrics.observe("obscenity_text_tokens", len(tokens))
+        return tokens
+
+    def _get_words(self, text: str) -> List[str]:
+        """
+        Returns distinct words of a text in order of their first occurrence.
+        """
+        return list(dict.fromkeys(token.value for token in self._tokenize(text)))
+
+    def _get_normalized_words(self, text: str) -> Dict[str, str]:
+        return {word: self.normalize_word(word) for word in self._get_words(text)}
 
     def get_similar_words(self, text, limit=1):
-        similar_words_dict = dict()
-        for word in text.split(" "):
-            similar_words = ObsceneWord.objects.annotate(
-                calc_similarity=TrigramSimilarity("normalized_value", self.normalize_word(word))
-            ).order_by('-calc_similarity')[0:limit]
-            similar_words_dict[word] = similar_words
-        return similar_words_dict
+        """
+        Returns top limit most similar obscene words for every distinct word of a text,
+        all words are looked up by the backend at once.
+        """
+        self.sync_dictionary_version()
+        normalized_words = self._get_normalized_words(text)
+        with metrics.stage("similar_words"):
+            similar_words = self.backend.get_similar_words(list(dict.fromkeys(normalized_words.values())), limit)
+        return {word: similar_words[normalized_word] for word, normalized_word in normalized_words.items()}
+
+    async def aget_similar_words(self, text, limit=1):
+        await self.async_dictionary_version()
+        normalized_words = self._get_normalized_words(text)
+        with metrics.stage("similar_words"):
+            similar_words = await self.backend.aget_similar_words(
+                list(dict.fromkeys(normalized_words.values())), limit
+            )
+        return {word: similar_words[normalized_word] for word, normalized_word in normalized_words.items()}
+
+    def fold_word(self, word: str) -> str:
+        return fold_word(word, self.normalize_word)
+
+    def get_skeletons(self, word: str) -> List[str]:
+        return get_skeletons(word, self.normalize_word)
+
+    def get_word_variants(self, word: str) -> list:
+        """
+        Returns distinct non-empty normalized variants of a word produced by transformations.
+        If the backend matches skeletons of obscene words, the only variant is the folded word.
+        """
+        if self.backend.folds_words:
+            folded_word = self.fold_word(word)
+            return [folded_word] if folded_word else []
+        return self.pipeline.variants(word)
+
+    def _prefilter(self, variants: List[str]):
+        """
+        Returns matches of variants resolved by the prefilter and variants which must be checked by the backend.
+        """
+        if self.prefilter is None:
+            return dict(), variants
+        with metrics.stage("prefilter"):
+            resolved, unresolved = self.prefilter.resolve(variants, self.obscenity_indicator)
+        return {variant: match for variant, match in resolved.items() if match is not None}, unresolved
+
+    def _find_matches(self, variants: List[str]) -> Dict[str, str]:
+        found_matches, unresolved_variants = self._prefilter(variants)
+        with metrics.stage("backend"):
+            found_matches.update(self.backend.find_matches(unresolved_variants, self.obscenity_indicator))
+        return found_matches
+
+    async def _afind_matches(self, variants: List[str]) -> Dict[str, str]:
+        if self.prefilter is not None:
+            await self.prefilter.aload()
+        found_matches, unresolved_variants = self._prefilter(variants)
+        with metrics.stage("backend"):
+            found_matches.update(await self.backend.afind_matches(unresolved_variants, self.obscenity_indicator))
+        return found_matches
+
+    def _is_any_obscene(self, variants: List[str]) -> bool:
+        found_matches, unresolved_variants = self._prefilter(variants)
+        if found_matches:
+            return True
+        with metrics.stage("backend"):
+            return self.backend.is_any_obscene(unresolved_variants, self.obscenity_indicator)
+
+    async def _ais_any_obscene(self, variants: List[str]) -> bool:
+        if self.prefilter is not None:
+            await self.prefilter.aload()
+        found_matches, unresolved_variants = self._prefilter(variants)
+        if found_matches:
+            return True
+        with metrics.stage("backend"):
+            return await self.backend.ais_any_obscene(unresolved_variants, self.obscenity_indicator)
+
+    def _get_cached_matches(self, words: Iterable[str], stop_on_match: bool):
+        """
+        Resolves words by cached verdicts.
+        Returns matches of resolved words, variants of unresolved words
+        and matches of these variants (MISSING for variants which must be checked by the backend).
+        """
+        with metrics.stage("variants"):
+            return self._get_cached_variant_matches(words, stop_on_match)
+
+    def _get_cached_variant_matches(self, words: Iterable[str], stop_on_match: bool):
+        matches = dict()
+        unresolved_words = dict()
+        for word in dict.fromkeys(words):
+            match = self.word_cache.get(word)
+            if match is MISSING:
+                unresolved_words[word] = self.get_word_variants(word)
+                continue
+            matches[word] = match
+            if stop_on_match and match is not None:
+                return matches, dict(), dict()
+
+        variant_matches = dict()
+        for variant in dict.fromkeys(variant for variants in unresolved_words.values() for variant in variants):
+            variant_matches[variant] = self.variant_cache.get(variant)
+        return matches, unresolved_words, variant_matches
+
+    def _resolve_matches(self, matches, unresolved_words, variant_matches, found_matches):
+        for variant, match in variant_matches.items():
+            if match is MISSING:
+                variant_matches[variant] = found_matches.get(variant)
+                self.variant_cache.set(variant, variant_matches[variant])
+
+        for word, variants in unresolved_words.items():
+            matches[word] = next(
+                (variant_matches[variant] for variant in variants if variant_matches[variant] is not None), None
+            )
+            self.word_cache.set(word, matches[word])
+        return matches
+
+    def match_words(self, words: Iterable[str], stop_on_match=False) -> Dict[str, Optional[str]]:
+        """
+        Returns matched obscene word (or None) for every distinct word.
+        Cached verdicts are used first, variants of other words are checked by the backend at once.
+        If stop_on_match is True, returns as soon as a cached obscene word is found.
+        """
+        self.sync_dictionary_version()
+        matches, unresolved_words, variant_matches = self._get_cached_matches(words, stop_on_match)
+        unresolved_variants = [variant for variant, match in variant_matches.items() if match is MISSING]
+        found_matches = self._find_matches(unresolved_variants)
+        return self._resolve_matches(matches, unresolved_words, variant_matches, found_matches)
+
+    async def amatch_words(self, words: Iterable[str], stop_on_match=False) -> Dict[str, Optional[str]]:
+        await self.async_dictionary_version()
+        matches, unresolved_words, variant_matches = self._get_cached_matches(words, stop_on_match)
+        unresolved_variants = [variant for variant, match in variant_matches.items() if match is MISSING]
+        found_matches = await self._afind_matches(unresolved_variants)
+        return self._resolve_matches(matches, unresolved_words, variant_matches, found_matches)
+
+    def _get_words_variants(self, words: Iterable[str]) -> list:
+        with metrics.stage("variants"):
+            return list(
+                dict.fromkeys(variant for word in dict.fromkeys(words) for variant in self.get_word_variants(word))
+            )
+
+    def _is_any_word_obscene(self, words: Iterable[str]) -> bool:
+        if not self.verdict_cache_size:
+            self.sync_dictionary_version()
+            return self._is_any_obscene(self._get_words_variants(words))
+        return any(match is not None for match in self.match_words(words, stop_on_match=True).values())
+
+    async def _ais_any_word_obscene(self, words: Iterable[str]) -> bool:
+        if not self.verdict_cache_size:
+            await self.async_dictionary_version()
+            return await self._ais_any_obscene(self._get_words_variants(words))
+        return any(match is not None for match in (await self.amatch_words(words, stop_on_match=True)).values())
 
     def is_word_obscene(self, word: str) -> bool:
-        for transformation in self.transformations:
-            normalized_word = self.normalize_word(transformation(word))
-            if self._similarity_obscene_check(TrigramSimilarity("normalized_value", normalized_word)):
-                return True
-        return False
+        return self._is_any_word_obscene([word])
+
+    async def ais_word_obscene(self, word: str) -> bool:
+        return await self._ais_any_word_obscene([word])
+
+    def _find_compound_spans(self, text: str, tokens: List[Token]) -> List[ObsceneSpan]:
+        """
+        Returns spans of obscene words glued into other words or split across several words.
+        Words are joined once for every transformation.
+        """
+        if self.compound_detector is None or not tokens:
+            return []
+        spans = dict()
+        with metrics.stage("compound"):
+            tokens_forms = [self.pipeline.forms(token.value) for token in tokens]
+            for normalized_words in dict.fromkeys(zip(*tokens_forms)):
+                for first, last, match in self.compound_detector.find(normalized_words):
+                    start, end = tokens[first].start, tokens[last].end
+                    spans.setdefault((start, end), ObsceneSpan(start, end, text[start:end], match))
+        return list(spans.values())
+
+    async def _afind_compound_spans(self, text: str, tokens: List[Token]) -> List[ObsceneSpan]:
+        if self.compound_detector is not None:
+            await self.compound_detector.aload()
+        return self._find_compound_spans(text, tokens)
 
     def is_text_obscene(self, text: str) -> bool:
         """
         Determines if any word in a given text is obscene.
+        All variants of all words are checked by the backend at once.
         """
-        for word in text.split(" "):
-            if self.is_word_obscene(word):
-                return True
+        tokens = self._tokenize(text)
+        if self._is_any_word_obscene(token.value for token in tokens) or self._find_compound_spans(text, tokens):
+            return True
 
         if self.suspicious_words_check:
             self._add_suspicious_words(text)
 
         return False
 
+    async def ais_text_obscene(self, text: str) -> bool:
+        """
+        Async version of is_text_obscene, database queries and GPT request don't block the event loop.
+        """
+        tokens = self._tokenize(text)
+        if await self._ais_any_word_obscene(token.value for token in tokens):
+            return True
+        if await self._afind_compound_spans(text, tokens):
+            return True
+
+        if self.suspicious_words_check:
+            self._add_suspicious_words(text)
+
+        return False
+
+    def _get_text_analysis(
+            self,
+            text: str,
+            tokens: List[Token],
+            matches: Dict[str, Optional[str]],
+            compound_spans: List[ObsceneSpan],
+    ) -> TextAnalysis:
+        found_spans = [
+            ObsceneSpan(token.start, token.end, token.value, matches[token.value])
+            for token in tokens
+            if matches[token.value] is not None
+        ]
+        # overlapping spans are merged to the first longest one
+        spans = []
+        for span in sorted(found_spans + compound_spans, key=lambda span: (span.start, -span.end)):
+            if not spans or span.start >= spans[-1].end:
+                spans.append(span)
+        if not spans and self.suspicious_words_check:
+            self._add_suspicious_words(text)
+        return TextAnalysis(bool(spans), spans)
+
+    def analyze_text(self, text: str) -> TextAnalysis:
+        """
+        Returns verdict of a text and spans of all obscene words with matched dictionary words.
+        Distinct words are checked at once, so one evaluation gives both the verdict and the positions.
+        """
+        tokens = self._tokenize(text)
+        matches = self.match_words(token.value for token in tokens)
+        return self._get_text_analysis(text, tokens, matches, self._find_compound_spans(text, tokens))
+
+    async def aanalyze_text(self, text: str) -> TextAnalysis:
+        tokens = self._tokenize(text)
+        matches = await self.amatch_words(token.value for token in tokens)
+        return self._get_text_analysis(text, tokens, matches, await self._afind_compound_spans(text, tokens))
+
+    def mask_text(self, text: str, spans: List[ObsceneSpan]) -> str:
+        """
+        Replaces every character of obscene spans with MASK_CHARACTER.
+        """
+        parts = []
+        position = 0
+        for span in spans:
+            parts.append(text[position:span.start])
+            parts.append(self.MASK_CHARACTER * (span.end - span.start))
+            position = span.end
+        parts.append(text[position:])
+        return "".join(parts)
+
+    def censor_text(self, text: str) -> CensoredText:
+        """
+        Returns a text with masked obscene words and their spans, the text is evaluated once.
+        """
+        analysis = self.analyze_text(text)
+        return CensoredText(0, self.mask_text(text, analysis.spans), analysis.spans)
+
+    async def acensor_text(self, text: str) -> CensoredText:
+        analysis = await self.aanalyze_text(text)
+        return CensoredText(0, self.mask_text(text, analysis.spans), analysis.spans)
+
+    def iter_censored_chunks(self, text: str, chunk_size=CENSOR_STREAM_CHUNK_SIZE) -> Iterator[CensoredText]:
+        """
+        Censors a long text chunk by chunk, chunks are cut at whitespace.
+        Spans have offsets in the whole text, concatenated chunks give the whole censored text.
+        """
+        for offset, chunk in split_text(text, chunk_size):
+            censored_chunk = self.censor_text(chunk)
+            yield CensoredText(
+                offset,
+                censored_chunk.text,
+                [span._replace(start=span.start + offset, end=span.end + offset) for span in censored_chunk.spans],
+            )
+
+    def get_texts_obscene_words(self, texts: List[str]) -> List[List[str]]:
+        """
+        Returns distinct matched obscene words of each text.
+        Words are deduplicated across all texts and checked in one pass.
+        """
+        texts_tokens = [self._tokenize(text) for text in texts]
+        matches = self.match_words(token.value for tokens in texts_tokens for token in tokens)
+        texts_obscene_words = []
+        for text, tokens in zip(texts, texts_tokens):
+            obscene_words = [matches[token.value] for token in tokens if matches[token.value] is not None]
+            obscene_words.extend(span.match for span in self._find_compound_spans(text, tokens))
+            texts_obscene_words.append(list(dict.fromkeys(obscene_words)))
+        return texts_obscene_words
+
+    def are_texts_obscene(self, texts: List[str]) -> List[bool]:
+        """
+        Determines if each text is obscene.
+        Words are deduplicated across all texts and checked in one pass.
+        """
+        verdicts = [bool(obscene_words) for obscene_words in self.get_texts_obscene_words(texts)]
+
+        if self.suspicious_words_check:
+            for text, is_obscene in zip(texts, verdicts):
+                if not is_obscene:
+                    self._add_suspicious_words(text)
+
+        return verdicts
+
     def create_obscene_word(self, word: str) -> ObsceneWord:
         """
         Creates or updates an obscene word in the database.
         """
-        obscene_word, _ = ObsceneWord.objects.get_or_create(value=word)
-        obscene_word.normalized_value = self.normalize_word(word)
-        obscene_word.save()
-        return obscene_word
+        return self.add_obscene_words([word])[0]
+
+    def add_obscene_words(self, words: Iterable[str]) -> List[ObsceneWord]:
+        """
+        Creates or updates obscene words in one transaction with one upsert.
+        Words get a new dictionary version which only adds words, so workers add them to their dictionary copies.
+        """
+        words = list(dict.fromkeys(words))
+        if not words:
+            return []
+        with transaction.atomic():
+            # the version row is locked until commit, so words of lower versions are committed first
+            version = bump_dictionary_version(reset=False)
+            obscene_words = ObsceneWord.objects.bulk_create(
+                [
+                    ObsceneWord(value=word, normalized_value=self.normalize_word(word), version=version)
+                    for word in words
+                ],
+                update_conflicts=True,
+                unique_fields=["value"],
+                update_fields=["normalized_value", "version"],
+            )
+            self._create_skeletons(obscene_words)
+        return obscene_words
+
+    def approve_suspicious_words(self, ids: Iterable[int]) -> int:
+        """
+        Adds pending suspicious words to the dictionary in one transaction. Returns number of added words.
+        """
+        with transaction.atomic():
+            suspicious_words = SuspiciousWord.objects.select_for_update().filter(
+                id__in=list(ids), status=SuspiciousWord.SuspiciousWordStatuses.PENDING
+            ).order_by("id")
+            values = {suspicious_word.id: suspicious_word.value for suspicious_word in suspicious_words}
+            SuspiciousWord.objects.filter(id__in=values).update(status=SuspiciousWord.SuspiciousWordStatuses.ADDED)
+            self.add_obscene_words(values.values())
+        return len(values)
+
+    def decline_suspicious_words(self, ids: Iterable[int]) -> int:
+        """
+        Declines pending suspicious words. Returns number of declined words.
+        """
+        return SuspiciousWord.objects.filter(
+            id__in=list(ids), status=SuspiciousWord.SuspiciousWordStatuses.PENDING
+        ).update(status=SuspiciousWord.SuspiciousWordStatuses.DECLINED)
+
+    def save_skeletons(self, obscene_words: List[ObsceneWord]):
+        """
+        Replaces skeletons of saved obscene words.
+        """
+        ObsceneWordSkeleton.objects.filter(word__in=obscene_words).delete()
+        self._create_skeletons(obscene_words)
+
+    def _create_skeletons(self, obscene_words: List[ObsceneWord]):
+        ObsceneWordSkeleton.objects.bulk_create(
+            [
+                ObsceneWordSkeleton(word=obscene_word, value=skeleton)
+                for obscene_word in obscene_words
+                for skeleton in self.get_skeletons(obscene_word.value)
+            ],
+            ignore_conflicts=True,
+        )
+
+    def import_obscene_words(
+            self,
+            words: Iterable[str],
+            chunk_size=IMPORT_CHUNK_SIZE,
+            progress: Optional[Callable[[int], None]] = None,
+    ) -> ImportResult:
+        """
+        Creates or updates many obscene words, words are read lazily and upserted in chunks.
+        Dictionary version is bumped once at the end, also if import fails after some chunks are committed.
+        Returns numbers of imported and skipped too long words.
+        """
+        max_length = ObsceneWord._meta.get_field("value").max_length
+        imported = skipped = 0
+        try:
+            for chunk in chunked(words, chunk_size):
+                # the same word can't be upserted twice in one statement
+                chunk_words = dict.fromkeys(chunk)
+                obscene_words = [
+                    ObsceneWord(value=word, normalized_value=self.normalize_word(word))
+                    for word in chunk_words
+                    if len(word) <= max_length
+                ]
+                skipped += len(chunk_words) - len(obscene_words)
+                with transaction.atomic():
+                    # primary keys of inserted and updated words are returned by the upsert
+                    obscene_words = ObsceneWord.objects.bulk_create(
+                        obscene_words,
+                        update_conflicts=True,
+                        unique_fields=["value"],
+                        update_fields=["normalized_value"],
+                    )
+                    # skeletons depend only on the value, so existing skeletons of updated words stay valid
+                    self._create_skeletons(obscene_words)
+                imported += len(obscene_words)
+                if progress:
+                    progress(imported)
+        finally:
+            self.dictionary_changed()
+        return ImportResult(imported, skipped)
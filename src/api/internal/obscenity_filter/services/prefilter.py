@@ -0,0 +1,174 @@
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+
+from api.internal.obscenity_filter.models import ObsceneWord
+from api.internal.obscenity_filter.services.aho_corasick import AhoCorasickAutomaton
+from api.internal.obscenity_filter.services.dictionary_version import get_dictionary_version
+from api.internal.obscenity_filter.services.snapshot import open_snapshot
+from api.internal.obscenity_filter.services.trigrams import get_trigrams, to_float4, trigram_similarity
+from config.settings import DICTIONARY_SNAPSHOT_PATH
+
+
+class PrefilterDictionary(NamedTuple):
+    automaton: AhoCorasickAutomaton
+    # (value, normalized_value, similarity threshold, trigrams count)
+    entries: List[Tuple[str, str, Optional[float], int]]
+    # entry ids of every pattern of the automaton
+    pattern_entries: List[List[int]]
+    trigram_counts: List[int]
+
+
+class DictionaryPrefilter:
+    """
+    Cheap stage in front of trigram similarity search which resolves most of the candidates without it:
+    - Aho-Corasick automaton over all normalized obscene words finds exact and substring hits
+      in one pass over all candidates. An exact hit is obscene, a substring hit is obscene
+      if similarity to the found word is high enough.
+    - Candidates which can't reach obscenity_indicator with any word only because of difference
+      in number of trigrams are clean: similarity can't be more than min(a, b) / max(a, b).
+    Other candidates are left for the matching backend.
+
+    The dictionary is loaded lazily on first use and reloaded after invalidate(),
+    from the dictionary snapshot if it is fresh. Added words are kept in a small dictionary next to the loaded one,
+    only it is rebuilt on addition, both are merged by the next reload.
+    New dictionaries are built aside and replace the old ones at once, so other threads resolve with one of them.
+    """
+
+    def __init__(self, snapshot_path=DICTIONARY_SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        # the loaded dictionary and the dictionary of added words if any
+        self._dictionaries: Optional[Tuple[PrefilterDictionary, ...]] = None
+        # loads and additions replace dictionaries one by one, so an addition isn't lost
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._dictionaries = None
+
+    def load_entries(self, entries: Iterable[Tuple[str, str, Optional[float]]]) -> Tuple[PrefilterDictionary, ...]:
+        """
+        Builds the automaton by (value, normalized_value, similarity threshold) of obscene words.
+        """
+        dictionaries = (self._build(entries),)
+        with self._lock:
+            self._dictionaries = dictionaries
+        return dictionaries
+
+    def add_entries(self, entries: Iterable[Tuple[str, str, Optional[float]]]):
+        """
+        Adds (value, normalized_value, similarity threshold) of added words to the loaded dictionary
+        without reading it from the database again.
+        """
+        with self._lock:
+            if self._dictionaries is None:
+                return
+            dictionary, *added_dictionaries = self._dictionaries
+            added_entries = (entry[:3] for added_dictionary in added_dictionaries for entry in added_dictionary.entries)
+            self._dictionaries = (dictionary, self._build(chain(added_entries, entries)))
+
+    def _build(self, entries: Iterable[Tuple[str, str, Optional[float]]]) -> PrefilterDictionary:
+        known_values = set()
+        dictionary_entries = []
+        pattern_entries = dict()
+        trigram_counts = set()
+        for value, normalized_value, threshold in entries:
+            if not normalized_value or value in known_values:
+                continue
+            known_values.add(value)
+            trigrams_count = len(get_trigrams(normalized_value))
+            pattern_entries.setdefault(normalized_value, []).append(len(dictionary_entries))
+            dictionary_entries.append((value, normalized_value, threshold, trigrams_count))
+            trigram_counts.add(trigrams_count)
+        automaton = AhoCorasickAutomaton(pattern_entries)
+        return PrefilterDictionary(
+            automaton,
+            dictionary_entries,
+            [pattern_entries[pattern] for pattern in automaton.patterns],
+            sorted(trigram_counts),
+        )
+
+    def load(self) -> Tuple[PrefilterDictionary, ...]:
+        snapshot = open_snapshot(self.snapshot_path, get_dictionary_version()) if self.snapshot_path else None
+        if snapshot is not None:
+            return self.load_entries(snapshot.iter_entries())
+        return self.load_entries(ObsceneWord.objects.values_list("value", "normalized_value", "similarity").iterator())
+
+    async def aload(self):
+        if self._dictionaries is None:
+            await sync_to_async(self.load)()
+
+    def _get_dictionaries(self) -> Tuple[PrefilterDictionary, ...]:
+        dictionaries = self._dictionaries
+        if dictionaries is None:
+            return self.load()
+        return dictionaries
+
+    def _can_be_similar(self, dictionary: PrefilterDictionary, trigrams_count: int, obscenity_indicator: float) -> bool:
+        if not dictionary.trigram_counts:
+            return False
+        position = bisect_left(dictionary.trigram_counts, trigrams_count)
+        nearest_counts = dictionary.trigram_counts[max(position - 1, 0):position + 1]
+        return any(
+            to_float4(min(trigrams_count, count) / max(trigrams_count, count)) > obscenity_indicator
+            for count in nearest_counts
+        )
+
+    def _get_entry_match(
+            self, dictionary: PrefilterDictionary, entry_id: int, candidate_trigrams: set, obscenity_indicator: float
+    ) -> Optional[str]:
+        value, normalized_value, threshold, trigrams_count = dictionary.entries[entry_id]
+        calc_similarity = trigram_similarity(
+            len(candidate_trigrams & get_trigrams(normalized_value)), len(candidate_trigrams), trigrams_count
+        )
+        if calc_similarity > obscenity_indicator and (threshold is None or calc_similarity > threshold):
+            return value
+        return None
+
+    def resolve(self, candidates: List[str], obscenity_indicator: float) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        """
+        Returns resolved candidates with their matches (None for clean candidates) and unresolved candidates.
+        """
+        dictionaries = self._get_dictionaries()
+        if not candidates:
+            return dict(), []
+
+        # all candidates are scanned as one text, they contain only word characters, so space separates them
+        starts = []
+        position = 0
+        for candidate in candidates:
+            starts.append(position)
+            position += len(candidate) + 1
+        text = " ".join(candidates)
+        hits = dict()
+        for dictionary in dictionaries:
+            for start, pattern_id in dictionary.automaton.iter_matches(text):
+                hits.setdefault(bisect_right(starts, start) - 1, []).append((dictionary, pattern_id))
+
+        resolved = dict()
+        unresolved = []
+        for candidate_id, candidate in enumerate(candidates):
+            candidate_trigrams = get_trigrams(candidate)
+            match = None
+            # the longest hits are the most similar ones
+            candidate_hits = sorted(hits.get(candidate_id, ()), key=lambda hit: -len(hit[0].automaton.patterns[hit[1]]))
+            for dictionary, pattern_id in candidate_hits:
+                for entry_id in dictionary.pattern_entries[pattern_id]:
+                    match = self._get_entry_match(dictionary, entry_id, candidate_trigrams, obscenity_indicator)
+                    if match is not None:
+                        break
+                if match is not None:
+                    break
+            if match is not None:
+                resolved[candidate] = match
+            elif any(
+                self._can_be_similar(dictionary, len(candidate_trigrams), obscenity_indicator)
+                for dictionary in dictionaries
+            ):
+                unresolved.append(candidate)
+            else:
+                resolved[candidate] = None
+        return resolved, unresolved
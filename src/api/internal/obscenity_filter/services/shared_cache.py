@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, Awaitable, Callable
+
+from django.core.cache import caches
+
+from api.internal.obscenity_filter.services.dictionary_version import aget_dictionary_version, \
+    get_dictionary_version, SHARED_DICTIONARY_VERSION_KEY
+from api.internal.obscenity_filter.services.tokenizer import tokenize
+from config.settings import SHARED_VERDICT_CACHE_ALIAS, SHARED_VERDICT_CACHE_LOCK_TIMEOUT, \
+    SHARED_VERDICT_CACHE_TTL, SHARED_VERDICT_CACHE_VERSION_TTL
+
+KEY_PREFIX = "obscenity"
+# waiting for a result computed by another worker
+POLL_INTERVAL = 0.02
+
+
+def get_text_hash(text: str, *params) -> str:
+    """
+    Hash of words of a text: texts which differ only in whitespace and punctuation between words
+    are split to the same words and have the same verdicts.
+    """
+    words = "\0".join(token.value for token in tokenize(text))
+    return hashlib.sha256("\0\0".join([words, *map(str, params)]).encode()).hexdigest()
+
+
+class SharedVerdictCache:
+    """
+    Verdicts of whole texts shared by all workers and nodes through a Django cache, so a repeated text
+    is answered by one cache lookup without the filter.
+
+    Keys contain the dictionary version, which is cached too for version_ttl seconds and is dropped
+    when the dictionary is changed, so verdicts of old dictionary versions are never read.
+    Only one worker computes a missing verdict, others wait for it up to lock_timeout seconds
+    and compute it themselves after that.
+    """
+
+    def __init__(
+            self,
+            alias=SHARED_VERDICT_CACHE_ALIAS,
+            ttl=SHARED_VERDICT_CACHE_TTL,
+            version_ttl=SHARED_VERDICT_CACHE_VERSION_TTL,
+            lock_timeout=SHARED_VERDICT_CACHE_LOCK_TIMEOUT,
+    ):
+        self.alias = alias
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.lock_timeout = lock_timeout
+
+    @property
+    def cache(self):
+        # caches are thread local
+        return caches[self.alias]
+
+    def _get_version(self) -> int:
+        version = self.cache.get(SHARED_DICTIONARY_VERSION_KEY)
+        if version is None:
+            version = get_dictionary_version()
+            self.cache.add(SHARED_DICTIONARY_VERSION_KEY, version, self.version_ttl)
+        return version
+
+    async def _aget_version(self) -> int:
+        version = await self.cache.aget(SHARED_DICTIONARY_VERSION_KEY)
+        if version is None:
+            version = await aget_dictionary_version()
+            await self.cache.aadd(SHARED_DICTIONARY_VERSION_KEY, version, self.version_ttl)
+        return version
+
+    def _get_key(self, kind: str, version: int, text: str, *params) -> str:
+        return f"{KEY_PREFIX}:{kind}:{version}:{get_text_hash(text, *params)}"
+
+    def get_or_compute(self, kind: str, text: str, compute: Callable[[], Any], *params) -> Any:
+        """
+        Returns cached result of compute() for a text and params, computes and caches it on miss.
+        """
+        key = self._get_key(kind, self._get_version(), text, *params)
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        lock_key = f"{key}:lock"
+        locked = self.cache.add(lock_key, True, self.lock_timeout)
+        if not locked:
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                value = self.cache.get(key)
+                if value is not None:
+                    return value
+        try:
+            value = compute()
+            self.cache.set(key, value, self.ttl)
+        finally:
+            if locked:
+                self.cache.delete(lock_key)
+        return value
+
+    async def aget_or_compute(self, kind: str, text: str, compute: Callable[[], Awaitable[Any]], *params) -> Any:
+        key = self._get_key(kind, await self._aget_version(), text, *params)
+        value = await self.cache.aget(key)
+        if value is not None:
+            return value
+        lock_key = f"{key}:lock"
+        locked = await self.cache.aadd(lock_key, True, self.lock_timeout)
+        if not locked:
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(POLL_INTERVAL)
+                value = await self.cache.aget(key)
+                if value is not None:
+                    return value
+        try:
+            value = await compute()
+            await self.cache.aset(key, value, self.ttl)
+        finally:
+            if locked:
+                await self.cache.adelete(lock_key)
+        return value
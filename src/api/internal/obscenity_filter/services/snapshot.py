@@ -0,0 +1,226 @@
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable, Iterator, Optional, Tuple
+
+from api.internal.obscenity_filter.services.trigrams import get_trigrams, trigram_similarity
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OBSDICT\0"
+FORMAT_VERSION = 1
+# magic, format version, entries, dictionary version, trigrams, postings
+HEADER = struct.Struct("<8sIIqII")
+# trigrams are three characters long, UTF-32 keeps every key the same size, so keys are binary searched in place
+TRIGRAM_KEY_SIZE = 12
+TRIGRAM_ENCODING = "utf-32-le"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _pad(size: int, alignment: int = 8) -> bytes:
+    return b"\0" * (-size % alignment)
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_snapshot(path: str, entries: Iterable[Tuple[str, str, Optional[float]]], dictionary_version: int) -> int:
+    """
+    Writes (value, normalized_value, similarity threshold) of obscene words to a snapshot file.
+    The file is replaced atomically, processes which mapped the previous file keep reading it.
+    Returns number of entries.
+
+    Layout, little-endian, every array is aligned to 8 bytes:
+    header, thresholds (float64, NaN without threshold), trigram counts (uint32),
+    value offsets, normalized value offsets (uint32, entries + 1), posting offsets (uint32, trigrams + 1),
+    postings (uint32 entry ids), sorted trigram keys (UTF-32), values and normalized values (UTF-8).
+    """
+    thresholds = array("d")
+    trigram_counts = array("I")
+    value_offsets = array("I", [0])
+    normalized_offsets = array("I", [0])
+    values = bytearray()
+    normalized_values = bytearray()
+    postings = dict()
+    for entry_id, (value, normalized_value, threshold) in enumerate(entries):
+        trigrams = get_trigrams(normalized_value)
+        thresholds.append(math.nan if threshold is None else threshold)
+        trigram_counts.append(len(trigrams))
+        values += value.encode()
+        value_offsets.append(len(values))
+        normalized_values += normalized_value.encode()
+        normalized_offsets.append(len(normalized_values))
+        for trigram in trigrams:
+            postings.setdefault(trigram.encode(TRIGRAM_ENCODING), []).append(entry_id)
+
+    keys = sorted(postings)
+    posting_offsets = array("I", [0])
+    entry_ids = array("I")
+    for key in keys:
+        entry_ids.extend(postings[key])
+        posting_offsets.append(len(entry_ids))
+
+    sections = [
+        _to_bytes(thresholds),
+        _to_bytes(trigram_counts),
+        _to_bytes(value_offsets),
+        _to_bytes(normalized_offsets),
+        _to_bytes(posting_offsets),
+        _to_bytes(entry_ids),
+        b"".join(keys),
+        bytes(values),
+        bytes(normalized_values),
+    ]
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(
+            HEADER.pack(MAGIC, FORMAT_VERSION, len(thresholds), dictionary_version, len(keys), len(entry_ids))
+        )
+        for section in sections:
+            snapshot_file.write(section)
+            snapshot_file.write(_pad(len(section)))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temp_path, path)
+    return len(thresholds)
+
+
+class _Strings:
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, entry_id: int) -> str:
+        return str(self._data[self._offsets[entry_id]:self._offsets[entry_id + 1]], "utf-8")
+
+
+class _Thresholds:
+    def __init__(self, thresholds: memoryview):
+        self._thresholds = thresholds
+
+    def __len__(self):
+        return len(self._thresholds)
+
+    def __getitem__(self, entry_id: int) -> Optional[float]:
+        threshold = self._thresholds[entry_id]
+        return None if math.isnan(threshold) else threshold
+
+
+class _TrigramKeys:
+    def __init__(self, data: memoryview):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data) // TRIGRAM_KEY_SIZE
+
+    def __getitem__(self, key_id: int) -> bytes:
+        return self._data[key_id * TRIGRAM_KEY_SIZE:(key_id + 1) * TRIGRAM_KEY_SIZE].tobytes()
+
+
+class DictionarySnapshot:
+    """
+    Read-only trigram index over a memory-mapped snapshot file, a drop-in replacement of TrigramIndex.
+
+    Arrays are views of the mapping, nothing is copied or decoded on load, so processes
+    which map the same file share its pages and load it in milliseconds.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self._mmap)
+        if len(data) < HEADER.size:
+            raise SnapshotError(f"{path} is too short")
+        magic, format_version, entries, self.dictionary_version, trigrams, postings = HEADER.unpack_from(data)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} is not a dictionary snapshot of format {FORMAT_VERSION}")
+        if sys.byteorder != "little":
+            raise SnapshotError("snapshots can be mapped only on little-endian hosts")
+
+        position = HEADER.size
+
+        def take(size: int, typecode: Optional[str] = None) -> memoryview:
+            nonlocal position
+            if position + size > len(data):
+                raise SnapshotError(f"{path} is truncated")
+            section = data[position:position + size]
+            position += size + len(_pad(size))
+            return section.cast(typecode) if typecode else section
+
+        thresholds = take(entries * 8, "d")
+        self.trigram_counts = take(entries * 4, "I")
+        value_offsets = take((entries + 1) * 4, "I")
+        normalized_offsets = take((entries + 1) * 4, "I")
+        self._posting_offsets = take((trigrams + 1) * 4, "I")
+        self._postings = take(postings * 4, "I")
+        self._keys = _TrigramKeys(take(trigrams * TRIGRAM_KEY_SIZE))
+        self.values = _Strings(value_offsets, take(value_offsets[entries]))
+        self.normalized_values = _Strings(normalized_offsets, take(normalized_offsets[entries]))
+        self.thresholds = _Thresholds(thresholds)
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def _get_postings(self, trigram: str) -> memoryview:
+        key = trigram.encode(TRIGRAM_ENCODING)
+        key_id = bisect_left(self._keys, key)
+        if key_id == len(self._keys) or self._keys[key_id] != key:
+            return self._postings[0:0]
+        return self._postings[self._posting_offsets[key_id]:self._posting_offsets[key_id + 1]]
+
+    def similarities(self, normalized_word: str) -> dict:
+        """
+        Returns similarity to every entry which has at least one common trigram with normalized_word.
+        """
+        trigrams = get_trigrams(normalized_word)
+        common_counts = Counter()
+        for trigram in trigrams:
+            common_counts.update(self._get_postings(trigram))
+        return {
+            entry_id: trigram_similarity(common_count, len(trigrams), self.trigram_counts[entry_id])
+            for entry_id, common_count in common_counts.items()
+        }
+
+    def iter_entries(self) -> Iterator[Tuple[str, str, Optional[float]]]:
+        for entry_id in range(len(self)):
+            yield self.values[entry_id], self.normalized_values[entry_id], self.thresholds[entry_id]
+
+
+def open_snapshot(path: str, dictionary_version: int) -> Optional[DictionarySnapshot]:
+    """
+    Maps a snapshot if it was built for the current dictionary version.
+    Returns None if there is no snapshot, it is broken or stale, the dictionary is loaded from the database then.
+    """
+    if not path:
+        return None
+    try:
+        snapshot = DictionarySnapshot(path)
+    except FileNotFoundError:
+        logger.warning("Dictionary snapshot %s doesn't exist, dictionary is loaded from the database", path)
+        return None
+    except (OSError, ValueError, SnapshotError) as e:
+        logger.warning("Dictionary snapshot %s can't be mapped: %s", path, e)
+        return None
+    if snapshot.dictionary_version != dictionary_version:
+        logger.info(
+            "Dictionary snapshot %s of version %s is stale, current version is %s",
+            path, snapshot.dictionary_version, dictionary_version,
+        )
+        return None
+    return snapshot
@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import queue
+import threading
+from typing import Callable, List, NamedTuple
+
+from django.db import close_old_connections
+from django.db.models import Q
+
+from api.internal.obscenity_filter.models import AnalyzedText, ObsceneWord, SuspiciousWord
+from api.internal.obscenity_filter.services.metrics import metrics
+from api.internal.obscenity_filter.services.tokenizer import tokenize
+from api.internal.obscenity_filter.services.verdict_cache import MISSING, VerdictCache
+from config.settings import SUSPICIOUS_WORDS_PROMPT_TOKENS, SUSPICIOUS_WORDS_QUEUE_SIZE, \
+    SUSPICIOUS_WORDS_RECENT_TEXTS
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough estimation of number of tokens in a text, one token is about four characters.
+    """
+    return len(text) // 4 + 1
+
+
+def get_hash(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class TextFingerprint(NamedTuple):
+    text: str
+    text_hash: str
+    tokens_hash: str
+    words: frozenset
+    normalized_words: frozenset
+
+
+class SuspiciousWordsCollector:
+    """
+    Finds suspicious words in clean texts with GPT off the request path.
+
+    Texts are put to a bounded queue, a background thread takes as many texts as fit into prompt_token_budget,
+    sends them in one prompt and saves found words as SuspiciousWord.
+    If the queue is full, new texts are dropped, so checks never wait for GPT.
+
+    GPT is not asked about texts which were already analyzed: repeats are recognized by hash of normalized text
+    and by hash of its normalized word set, both are stored in AnalyzedText.
+    Texts which consist only of known obscene and suspicious words are skipped too.
+    """
+
+    MODEL = "gpt-4o-mini"
+    PROMPT = (
+        "Find words in the texts that may be obscene. Texts are separated by empty lines. "
+        "Print ONLY found words separated by spaces without explanations"
+    )
+    TEXTS_SEPARATOR = "\n\n"
+
+    def __init__(
+            self,
+            gpt_client,
+            normalize_word: Callable[[str], str],
+            *,
+            queue_size=SUSPICIOUS_WORDS_QUEUE_SIZE,
+            prompt_token_budget=SUSPICIOUS_WORDS_PROMPT_TOKENS,
+            recent_texts=SUSPICIOUS_WORDS_RECENT_TEXTS,
+            background=True,
+    ):
+        self.gpt_client = gpt_client
+        self.normalize_word = normalize_word
+        self.prompt_token_budget = prompt_token_budget
+        self.background = background
+        self._recent_texts = VerdictCache(recent_texts, ttl=float("inf"))
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._next_text = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, text: str) -> bool:
+        """
+        Puts a text to the queue, returns False if it was dropped
+        because the same text was submitted recently or the queue is full.
+        """
+        metrics.inc("obscenity_suspicious_texts_total", result="submitted")
+        if self._recent_texts.get(text) is not MISSING:
+            metrics.inc("obscenity_suspicious_texts_total", result="duplicate")
+            return False
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            metrics.inc("obscenity_suspicious_texts_total", result="dropped")
+            return False
+        # dropped texts are not remembered, so they are submitted again next time
+        self._recent_texts.set(text, True)
+        if self.background:
+            self._ensure_worker()
+        return True
+
+    def _ensure_worker(self):
+        # thread is started lazily, so every gunicorn worker starts its own one after fork
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="suspicious-words", daemon=True)
+                self._thread.start()
+
+    def _get_text(self, block: bool):
+        if self._next_text is not None:
+            text, self._next_text = self._next_text, None
+            return text
+        return self._queue.get(block=block)
+
+    def _take_texts(self, block: bool) -> List[str]:
+        """
+        Takes texts from the queue while they fit into prompt_token_budget, the first text is taken anyway.
+        """
+        texts = [self._get_text(block)]
+        tokens = estimate_tokens(texts[0])
+        while True:
+            try:
+                text = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            tokens += estimate_tokens(text)
+            if tokens > self.prompt_token_budget:
+                # text doesn't fit, it will be the first text of the next prompt
+                self._next_text = text
+                break
+            texts.append(text)
+        return texts
+
+    def _process_next(self, block: bool) -> bool:
+        try:
+            texts = self._take_texts(block)
+        except queue.Empty:
+            return False
+        try:
+            self.process(texts)
+        except Exception:
+            logger.exception("Failed to find suspicious words in %s texts", len(texts))
+        return True
+
+    def _run(self):
+        while True:
+            self._process_next(block=True)
+            close_old_connections()
+
+    def drain(self):
+        """
+        Processes all queued texts in the current thread.
+        """
+        while self._process_next(block=False):
+            pass
+
+    def get_fingerprint(self, text: str) -> TextFingerprint:
+        words = [token.value for token in tokenize(text)]
+        normalized_words = [self.normalize_word(word) for word in words]
+        return TextFingerprint(
+            text=text,
+            text_hash=get_hash(" ".join(normalized_words)),
+            tokens_hash=get_hash(" ".join(sorted(set(normalized_words)))),
+            words=frozenset(words),
+            normalized_words=frozenset(normalized_words) - {""},
+        )
+
+    def _get_new_fingerprints(self, texts: List[str]) -> List[TextFingerprint]:
+        """
+        Returns fingerprints of texts which weren't analyzed yet, repeats are counted as duplicates.
+        """
+        fingerprints = dict()
+        for text in texts:
+            fingerprint = self.get_fingerprint(text)
+            if fingerprint.tokens_hash in fingerprints:
+                metrics.inc("obscenity_suspicious_texts_total", result="duplicate")
+                continue
+            fingerprints[fingerprint.tokens_hash] = fingerprint
+
+        analyzed_hashes = set()
+        for text_hash, tokens_hash in AnalyzedText.objects.filter(
+            Q(text_hash__in=[fingerprint.text_hash for fingerprint in fingerprints.values()])
+            | Q(tokens_hash__in=list(fingerprints))
+        ).values_list("text_hash", "tokens_hash"):
+            analyzed_hashes.update((text_hash, tokens_hash))
+
+        new_fingerprints = []
+        for fingerprint in fingerprints.values():
+            if fingerprint.text_hash in analyzed_hashes or fingerprint.tokens_hash in analyzed_hashes:
+                metrics.inc("obscenity_suspicious_texts_total", result="duplicate")
+            else:
+                new_fingerprints.append(fingerprint)
+        return new_fingerprints
+
+    def _has_novel_words(self, fingerprints: List[TextFingerprint]) -> List[bool]:
+        words = set().union(*(fingerprint.words for fingerprint in fingerprints))
+        normalized_words = set().union(*(fingerprint.normalized_words for fingerprint in fingerprints))
+        suspicious_words = set(SuspiciousWord.objects.filter(value__in=words).values_list("value", flat=True))
+        obscene_words = set(
+            ObsceneWord.objects.filter(normalized_value__in=normalized_words).values_list("normalized_value", flat=True)
+        )
+        return [
+            any(
+                word not in suspicious_words and self.normalize_word(word) not in obscene_words
+                for word in fingerprint.words
+            )
+            for fingerprint in fingerprints
+        ]
+
+    def process(self, texts: List[str]):
+        fingerprints = self._get_new_fingerprints(texts)
+        if not fingerprints:
+            return
+
+        texts_to_analyze = []
+        for fingerprint, has_novel_words in zip(fingerprints, self._has_novel_words(fingerprints)):
+            if has_novel_words:
+                texts_to_analyze.append(fingerprint.text)
+            else:
+                metrics.inc("obscenity_suspicious_texts_total", result="known_words")
+
+        if texts_to_analyze:
+            self.find_suspicious_words(texts_to_analyze)
+            metrics.inc("obscenity_suspicious_texts_total", len(texts_to_analyze), result="analyzed")
+
+        AnalyzedText.objects.bulk_create(
+            [
+                AnalyzedText(text_hash=fingerprint.text_hash, tokens_hash=fingerprint.tokens_hash)
+                for fingerprint in fingerprints
+            ],
+            ignore_conflicts=True,
+        )
+
+    def find_suspicious_words(self, texts: List[str]):
+        with metrics.stage("llm"):
+            completion = self.gpt_client.chat.completions.create(
+                model=self.MODEL,
+                messages=[
+                    {"role": "user", "content": self.PROMPT},
+                    {"role": "user", "content": self.TEXTS_SEPARATOR.join(texts)},
+                ],
+                temperature=0,
+                top_p=1,
+            )
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            metrics.inc("obscenity_llm_tokens_total", usage.prompt_tokens, kind="prompt")
+            metrics.inc("obscenity_llm_tokens_total", usage.completion_tokens, kind="completion")
+        suspicious_words = completion.choices[0].message.content or ""
+        SuspiciousWord.objects.bulk_create(
+            [
+                SuspiciousWord(value=word)
+                for word in dict.fromkeys(suspicious_words.split())
+                if len(word) <= SuspiciousWord._meta.get_field("value").max_length
+            ],
+            ignore_conflicts=True,
+        )
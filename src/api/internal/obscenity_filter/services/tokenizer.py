@@ -0,0 +1,50 @@
+import re
+from typing import Iterator, List, NamedTuple, Tuple
+
+# whitespace and punctuation which separates words,
+# characters used to mask letters (like "*", "@", ".", "-") stay inside tokens and are removed by normalization
+TOKEN_RE = re.compile(r"[^\s,;:!?()\[\]{}<>\"«»…]+")
+# dots, dashes and quotes around a token are punctuation, not part of the word
+TOKEN_EDGES = ".-'`"
+WHITESPACE_RE = re.compile(r"\s")
+LAST_WHITESPACE_RE = re.compile(r"\s\S*\Z")
+
+
+class Token(NamedTuple):
+    value: str
+    start: int
+    end: int
+
+
+def tokenize(text: str) -> List[Token]:
+    """
+    Splits a text to words in one pass, every token keeps its character offsets in the text.
+    """
+    tokens = []
+    for match in TOKEN_RE.finditer(text):
+        value = match.group()
+        stripped_value = value.strip(TOKEN_EDGES)
+        if not stripped_value:
+            continue
+        start = match.start() + len(value) - len(value.lstrip(TOKEN_EDGES))
+        tokens.append(Token(stripped_value, start, start + len(stripped_value)))
+    return tokens
+
+
+def split_text(text: str, chunk_size: int) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (offset, chunk) of a long text, chunks are about chunk_size characters long and are cut at whitespace,
+    so no word is split between chunks.
+    """
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            last_whitespace = LAST_WHITESPACE_RE.search(text, start, end + 1)
+            if last_whitespace is None:
+                next_whitespace = WHITESPACE_RE.search(text, end)
+                end = next_whitespace.start() + 1 if next_whitespace else len(text)
+            else:
+                end = last_whitespace.start() + 1
+        yield start, text[start:end]
+        start = end
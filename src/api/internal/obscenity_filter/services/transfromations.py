@@ -1,26 +1,16 @@
 import re
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
 
+REPEATING_CHARACTERS_RE = re.compile(r"(.)\1+")
+CYRILLIC_RE = re.compile(r"[а-яА-ЯёЁ]")
 
-def collapse_repeating_characters(input_string: str) -> str:
-    """
-    Collapses consecutive repeating characters into a single instance.
-    """
-    return re.sub(r"(.)\1+", r"\1", input_string)
+NUMBERS_TO_LETTERS_TABLE = str.maketrans(
+    {"0": "о", "1": "и", "3": "з", "4": "ч", "5": "s", "6": "б", "7": "г", "8": "В"}
+)
 
-
-def replace_numbers_to_letters(word: str) -> str:
-    """
-    Replaces numeric characters with visually similar letters.
-    """
-    numbers_to_letters = {"0": "о", "1": "и", "3": "з", "4": "ч", "5": "s", "6": "б", "7": "г", "8": "В"}
-    return word.translate(str.maketrans(numbers_to_letters))
-
-
-def replace_similar_latin_to_cyrillic(word: str) -> str:
-    """
-    Replaces latin characters with visually similar letters in cyrillic.
-    """
-    numbers_to_letters = {
+SIMILAR_LATIN_TO_CYRILLIC_TABLE = str.maketrans(
+    {
         "y": "у",
         "e": "е",
         "o": "о",
@@ -42,7 +32,57 @@ def replace_similar_latin_to_cyrillic(word: str) -> str:
         "M": "М",
         "n": "п",
     }
-    return word.translate(str.maketrans(numbers_to_letters))
+)
+
+
+def collapse_repeating_characters(input_string: str) -> str:
+    """
+    Collapses consecutive repeating characters into a single instance.
+    """
+    return REPEATING_CHARACTERS_RE.sub(r"\1", input_string)
+
+
+def replace_numbers_to_letters(word: str) -> str:
+    """
+    Replaces numeric characters with visually similar letters.
+    """
+    return word.translate(NUMBERS_TO_LETTERS_TABLE)
+
+
+def replace_similar_latin_to_cyrillic(word: str) -> str:
+    """
+    Replaces latin characters with visually similar letters in cyrillic.
+    """
+    return word.translate(SIMILAR_LATIN_TO_CYRILLIC_TABLE)
+
+
+def fold_word(word: str, normalize: Callable[[str], str]) -> str:
+    """
+    Canonical skeleton of a word: digits are replaced with letters, latin homoglyphs are replaced
+    with cyrillic letters in mixed script words (a word in latin only is a transliteration),
+    the word is normalized and repeating characters are collapsed.
+    """
+    word = replace_numbers_to_letters(word)
+    if CYRILLIC_RE.search(word):
+        word = replace_similar_latin_to_cyrillic(word)
+    return collapse_repeating_characters(normalize(word))
+
+
+def get_skeletons(word: str, normalize: Callable[[str], str]) -> List[str]:
+    """
+    Distinct non-empty skeleton forms of a dictionary word: canonical skeleton,
+    collapsed, digit-to-letter folded and homoglyph folded normalized values.
+    """
+    skeletons = dict.fromkeys(
+        [
+            fold_word(word, normalize),
+            normalize(collapse_repeating_characters(word)),
+            normalize(replace_numbers_to_letters(word)),
+            normalize(replace_similar_latin_to_cyrillic(word)),
+        ]
+    )
+    skeletons.pop("", None)
+    return list(skeletons)
 
 
 DEFAULT_TRANSFORMATIONS = [
@@ -51,3 +91,67 @@ DEFAULT_TRANSFORMATIONS = [
     collapse_repeating_characters,
     replace_similar_latin_to_cyrillic,
 ]
+
+
+class TransformationPipeline:
+    """
+    Applies transformations and normalization to a word and returns distinct normalized variants.
+    Transformations often return the word itself (e.g. there are no digits in it),
+    such results are normalized only once.
+
+    Obfuscations are often combined (digits instead of letters and repeated letters in one word),
+    so transformations are composed into chains up to max_chain_length transformations.
+    Chains are applied lazily from shorter to longer ones, as shorter chains are more likely,
+    and no more than variant_budget variants are returned for a word, so lookup cost stays bounded.
+    """
+
+    def __init__(
+            self,
+            transformations: Iterable[Callable[[str], str]],
+            normalize: Callable[[str], str],
+            max_chain_length=1,
+            variant_budget: Optional[int] = None,
+    ):
+        self.transformations = tuple(transformations)
+        self.normalize = normalize
+        self.max_chain_length = max_chain_length
+        self.variant_budget = variant_budget
+
+    def iter_variants(self, word: str) -> Iterator[str]:
+        """
+        Yields distinct non-empty normalized variants: results of single transformations in order of transformations,
+        then results of chains of two transformations and so on.
+        """
+        normalized_words = dict()
+        variants = set()
+        chain_results = [word]
+        for _ in range(self.max_chain_length):
+            next_chain_results = []
+            for chain_result in chain_results:
+                for transformation in self.transformations:
+                    transformed_word = transformation(chain_result)
+                    # results already reached by shorter chains are not transformed again
+                    if transformed_word in normalized_words:
+                        continue
+                    normalized_word = normalized_words[transformed_word] = self.normalize(transformed_word)
+                    next_chain_results.append(transformed_word)
+                    if normalized_word and normalized_word not in variants:
+                        variants.add(normalized_word)
+                        yield normalized_word
+            chain_results = next_chain_results
+
+    def variants(self, word: str) -> List[str]:
+        return list(islice(self.iter_variants(word), self.variant_budget))
+
+    def forms(self, word: str) -> List[str]:
+        """
+        Returns normalized result of every transformation in order of transformations, including repeats.
+        """
+        normalized_words = dict()
+        forms = []
+        for transformation in self.transformations:
+            transformed_word = transformation(word)
+            if transformed_word not in normalized_words:
+                normalized_words[transformed_word] = self.normalize(transformed_word)
+            forms.append(normalized_words[transformed_word])
+        return forms
@@ -0,0 +1,46 @@
+import re
+import struct
+
+WORD_RE = re.compile(r"[^\W_]+", flags=re.UNICODE)
+
+
+def get_trigrams(value: str) -> set:
+    """
+    Extracts a set of trigrams the same way pg_trgm does it:
+    - Splits value into words by non-alphanumeric characters.
+    - Lowercases every word and pads it with two spaces in front and one space at the end.
+    - Takes every sequence of three consecutive characters.
+    """
+    trigrams = set()
+    for word in WORD_RE.findall(value.lower()):
+        padded_word = f"  {word} "
+        for i in range(len(padded_word) - 2):
+            trigrams.add(padded_word[i:i + 3])
+    return trigrams
+
+
+def to_float4(value: float) -> float:
+    """
+    Rounds value to single precision, pg_trgm calculates similarity as float4.
+    """
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def trigram_similarity(common_count: int, first_count: int, second_count: int) -> float:
+    """
+    Calculates pg_trgm similarity by number of common trigrams and sizes of both trigram sets.
+    """
+    if first_count <= 0 or second_count <= 0:
+        return 0.0
+    return to_float4(common_count / (first_count + second_count - common_count))
+
+
+def similarity(first: str, second: str) -> float:
+    """
+    Local equivalent of pg_trgm similarity(first, second).
+    """
+    first_trigrams = get_trigrams(first)
+    second_trigrams = get_trigrams(second)
+    return trigram_similarity(
+        len(first_trigrams & second_trigrams), len(first_trigrams), len(second_trigrams)
+    )
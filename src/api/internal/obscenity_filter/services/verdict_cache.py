@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+MISSING = object()
+
+
+class VerdictCache:
+    """
+    Bounded LRU cache with TTL for verdicts of one dictionary version.
+    All entries are dropped when the dictionary version changes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def sync_version(self, version: int):
+        with self._lock:
+            if self.version != version:
+                self._entries.clear()
+                self.version = version
+
+    def retain(self, version: int, keep: Callable[[Any], bool]):
+        """
+        Moves entries to a new dictionary version, entries with values which must not be kept are dropped.
+        """
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if not keep(value)]:
+                del self._entries[key]
+            self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version = None
+
+    def get(self, key):
+        """
+        Returns cached value or MISSING if there is no actual value for the key.
+        """
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is MISSING:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
@@ -1,21 +1,146 @@
-from typing import List, Dict
+from functools import wraps
+from typing import List, Dict, Optional
+
+from django.http import JsonResponse, StreamingHttpResponse
 
 from api.internal.obscenity_filter.services.obscenity_filter import ObscenityFilterService
-from api.internal.obscenity_filter.transport.requests import TextIn
-from api.internal.obscenity_filter.transport.responses import ObsceneWordsOut
+from api.internal.obscenity_filter.services.shared_cache import SharedVerdictCache
+from api.internal.obscenity_filter.transport.requests import SimilarWordsIn, SuspiciousWordsIn, TextIn, TextsIn
+from api.internal.obscenity_filter.transport.responses import CensoredChunkOut, CensoredTextOut, ModeratedWordsOut, \
+    ObsceneSpanOut, ObsceneWordsOut, TextVerdictOut
+
+
+def limit_body_size(max_size: int):
+    """
+    Operation decorator which answers 413 by Content-Length before the body is read and validated.
+    """
+
+    def decorator(run):
+        @wraps(run)
+        def wrapper(request, *args, **kwargs):
+            try:
+                content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+            except ValueError:
+                content_length = 0
+            if content_length > max_size:
+                return JsonResponse(f"Request body must not be larger than {max_size} bytes", safe=False, status=413)
+            return run(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
 
 
 class TextHandler:
-    def __init__(self, obscenity_filter_service: ObscenityFilterService):
+    def __init__(
+            self,
+            obscenity_filter_service: ObscenityFilterService,
+            shared_cache: Optional[SharedVerdictCache] = None,
+    ):
         self._obscenity_filter_service = obscenity_filter_service
+        self._shared_cache = shared_cache
 
     def check_text(self, request, text_in: TextIn) -> (int, str):
         text = text_in.text
-        if self._obscenity_filter_service.is_text_obscene(text):
+        if self._shared_cache is None:
+            is_obscene = self._obscenity_filter_service.is_text_obscene(text)
+        else:
+            is_obscene = self._shared_cache.get_or_compute(
+                "check", text, lambda: self._obscenity_filter_service.is_text_obscene(text)
+            )
+        if is_obscene:
             return 400, "Obscene word!"
         return 200, "Your text is fine!"
 
-    def get_similar_words(self, request, text_in: TextIn) -> (int, Dict[str, List[ObsceneWordsOut]]):
+    def get_similar_words(self, request, similar_words_in: SimilarWordsIn) -> (int, Dict[str, List[ObsceneWordsOut]]):
+        text, limit = similar_words_in.text, similar_words_in.limit
+        if self._shared_cache is None:
+            words = self._obscenity_filter_service.get_similar_words(text, limit)
+        else:
+            words = self._shared_cache.get_or_compute(
+                "similar_words", text, lambda: self._obscenity_filter_service.get_similar_words(text, limit), limit
+            )
+        return 200, words
+
+    async def acheck_text(self, request, text_in: TextIn) -> (int, str):
         text = text_in.text
-        words = self._obscenity_filter_service.get_similar_words(text)
+        if self._shared_cache is None:
+            is_obscene = await self._obscenity_filter_service.ais_text_obscene(text)
+        else:
+            is_obscene = await self._shared_cache.aget_or_compute(
+                "check", text, lambda: self._obscenity_filter_service.ais_text_obscene(text)
+            )
+        if is_obscene:
+            return 400, "Obscene word!"
+        return 200, "Your text is fine!"
+
+    async def aget_similar_words(
+            self, request, similar_words_in: SimilarWordsIn
+    ) -> (int, Dict[str, List[ObsceneWordsOut]]):
+        text, limit = similar_words_in.text, similar_words_in.limit
+        if self._shared_cache is None:
+            words = await self._obscenity_filter_service.aget_similar_words(text, limit)
+        else:
+            words = await self._shared_cache.aget_or_compute(
+                "similar_words", text, lambda: self._obscenity_filter_service.aget_similar_words(text, limit), limit
+            )
         return 200, words
+
+    def check_texts(self, request, texts_in: TextsIn):
+        """
+        Checks all texts at once and streams verdicts as NDJSON in the order of texts.
+        """
+        verdicts = self._obscenity_filter_service.are_texts_obscene(texts_in.texts)
+        lines = (
+            TextVerdictOut(index=index, is_obscene=is_obscene).model_dump_json() + "\n"
+            for index, is_obscene in enumerate(verdicts)
+        )
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
+    @staticmethod
+    def _get_spans_out(spans) -> List[ObsceneSpanOut]:
+        return [ObsceneSpanOut(**span._asdict()) for span in spans]
+
+    def censor_text(self, request, text_in: TextIn) -> (int, CensoredTextOut):
+        censored_text = self._obscenity_filter_service.censor_text(text_in.text)
+        return 200, CensoredTextOut(text=censored_text.text, spans=self._get_spans_out(censored_text.spans))
+
+    async def acensor_text(self, request, text_in: TextIn) -> (int, CensoredTextOut):
+        censored_text = await self._obscenity_filter_service.acensor_text(text_in.text)
+        return 200, CensoredTextOut(text=censored_text.text, spans=self._get_spans_out(censored_text.spans))
+
+    def censor_text_stream(self, request, text_in: TextIn):
+        """
+        Censors a long text chunk by chunk and streams censored chunks as NDJSON.
+        """
+        lines = (
+            CensoredChunkOut(
+                offset=chunk.offset, text=chunk.text, spans=self._get_spans_out(chunk.spans)
+            ).model_dump_json() + "\n"
+            for chunk in self._obscenity_filter_service.iter_censored_chunks(text_in.text)
+        )
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
+
+class HealthHandler:
+    def __init__(self, obscenity_filter_service: ObscenityFilterService):
+        self._obscenity_filter_service = obscenity_filter_service
+
+    def ready(self, request) -> (int, str):
+        # warmup failed at start, e.g. the database wasn't available, it is retried by every probe
+        if not self._obscenity_filter_service.is_warmed_up and not self._obscenity_filter_service.try_warmup():
+            return 503, "Warming up"
+        return 200, "Ready"
+
+
+class ModerationHandler:
+    def __init__(self, obscenity_filter_service: ObscenityFilterService):
+        self._obscenity_filter_service = obscenity_filter_service
+
+    def approve_words(self, request, suspicious_words_in: SuspiciousWordsIn) -> (int, ModeratedWordsOut):
+        approved = self._obscenity_filter_service.approve_suspicious_words(suspicious_words_in.ids)
+        return 200, ModeratedWordsOut(processed=approved)
+
+    def decline_words(self, request, suspicious_words_in: SuspiciousWordsIn) -> (int, ModeratedWordsOut):
+        declined = self._obscenity_filter_service.decline_suspicious_words(suspicious_words_in.ids)
+        return 200, ModeratedWordsOut(processed=declined)
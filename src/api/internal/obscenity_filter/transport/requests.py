@@ -1,5 +1,22 @@
-from ninja import Schema
+from typing import List
+
+from ninja import Field, Schema
+
+from config.settings import BATCH_MAX_TEXTS, MODERATION_MAX_WORDS, SIMILAR_WORDS_MAX_LIMIT
 
 
 class TextIn(Schema):
     text: str
+
+
+class SimilarWordsIn(Schema):
+    text: str
+    limit: int = Field(1, ge=1, le=SIMILAR_WORDS_MAX_LIMIT)
+
+
+class TextsIn(Schema):
+    texts: List[str] = Field(..., max_length=BATCH_MAX_TEXTS)
+
+
+class SuspiciousWordsIn(Schema):
+    ids: List[int] = Field(..., max_length=MODERATION_MAX_WORDS)
@@ -1,6 +1,35 @@
+from typing import List
+
 from ninja import Schema
 
 
 class ObsceneWordsOut(Schema):
     value: str
     calc_similarity: float
+
+
+class TextVerdictOut(Schema):
+    index: int
+    is_obscene: bool
+
+
+class ObsceneSpanOut(Schema):
+    start: int
+    end: int
+    word: str
+    match: str
+
+
+class CensoredTextOut(Schema):
+    text: str
+    spans: List[ObsceneSpanOut]
+
+
+class CensoredChunkOut(Schema):
+    offset: int
+    text: str
+    spans: List[ObsceneSpanOut]
+
+
+class ModeratedWordsOut(Schema):
+    processed: int
@@ -0,0 +1,159 @@
+import io
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Sequence
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.internal.obscenity_filter.models import ObsceneWord
+from api.internal.obscenity_filter.services.backends import BACKENDS, get_backend
+from api.internal.obscenity_filter.services.importer import read_csv_words
+from api.internal.obscenity_filter.services.obscenity_filter import ObscenityFilterService
+from api.internal.obscenity_filter.services.prefilter import DictionaryPrefilter
+
+# dictionary and text words are built from different consonants, so generated texts are clean
+DICTIONARY_CONSONANTS = "бвгдклмнпрст"
+TEXT_CONSONANTS = "жфхцчшщ"
+VOWELS = "аеиоу"
+
+
+def generate_words(count: int, consonants: str, rng: random.Random, exclude=frozenset()) -> List[str]:
+    """
+    Generates distinct pseudo words of 2-4 syllables.
+    """
+    words = dict()
+    while len(words) < count:
+        word = "".join(rng.choice(consonants) + rng.choice(VOWELS) for _ in range(rng.randint(2, 4)))
+        if word not in exclude:
+            words[word] = None
+    return list(words)
+
+
+def generate_text(words_count: int, rng: random.Random) -> str:
+    return " ".join(generate_words(words_count, TEXT_CONSONANTS, rng))
+
+
+def parse_sizes(value: str) -> List[int]:
+    return sorted(int(size) for size in value.split(","))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures filter throughput and database queries per call on synthetic dictionaries and texts, "
+        "results are written as JSON lines. Generated words are rolled back"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dictionary-sizes", type=parse_sizes, default=[1000, 10000, 100000, 1000000])
+        parser.add_argument("--text-lengths", type=parse_sizes, default=[10, 100, 1000, 10000])
+        parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma separated matching backends")
+        parser.add_argument("--word-calls", type=int, default=100, help="Calls of is_word_obscene per measurement")
+        parser.add_argument("--text-calls", type=int, default=3, help="Calls per text measurement")
+        parser.add_argument(
+            "--similar-words-max-text",
+            type=int,
+            default=100,
+            help="get_similar_words is measured only for texts up to this number of words",
+        )
+        parser.add_argument("--cache", action="store_true", help="Measure with verdict cache enabled")
+        parser.add_argument("--prefilter", action="store_true", help="Measure with dictionary prefilter")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Append results to this JSONL file instead of stdout")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.run = {
+            "run": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "cache": options["cache"],
+            "prefilter": options["prefilter"],
+        }
+        self.output = open(options["output"], "a", encoding="utf-8") if options["output"] else sys.stdout
+        try:
+            texts = {length: generate_text(length, self.rng) for length in options["text_lengths"]}
+            self.benchmark_normalization(texts, options)
+            with transaction.atomic():
+                self.benchmark_dictionaries(texts, options)
+                transaction.set_rollback(True)
+        finally:
+            if self.output is not sys.stdout:
+                self.output.close()
+
+    def write(self, benchmark: str, result: dict, **params):
+        self.output.write(json.dumps({**self.run, "benchmark": benchmark, **params, **result}) + "\n")
+        self.output.flush()
+
+    @staticmethod
+    def measure(func: Callable, calls: Sequence[tuple], items_per_call=1) -> dict:
+        with CaptureQueriesContext(connection) as queries:
+            started_at = time.perf_counter()
+            for call_args in calls:
+                func(*call_args)
+            elapsed = time.perf_counter() - started_at
+        return {
+            "calls": len(calls),
+            "seconds_per_call": elapsed / len(calls),
+            "items_per_second": len(calls) * items_per_call / max(elapsed, 1e-9),
+            "queries_per_call": len(queries) / len(calls),
+        }
+
+    def benchmark_normalization(self, texts: dict, options):
+        service = ObscenityFilterService()
+        for length, text in texts.items():
+            calls = [(text,)] * options["text_calls"]
+            self.write("normalize_text", self.measure(service.normalize_text, calls, length), text_words=length)
+            words = text.split(" ")
+            self.write(
+                "word_variants",
+                self.measure(lambda: [service.get_word_variants(word) for word in words], [()], length),
+                text_words=length,
+            )
+
+    def benchmark_dictionaries(self, texts: dict, options):
+        # dictionary grows from one size to the next, only new words are imported
+        dictionary_words = []
+        for size in options["dictionary_sizes"]:
+            new_words = generate_words(
+                size - len(dictionary_words), DICTIONARY_CONSONANTS, self.rng, frozenset(dictionary_words)
+            )
+            dictionary_words.extend(new_words)
+            csv_file = io.StringIO("\n".join(new_words))
+            import_result = self.measure(
+                lambda: ObscenityFilterService().import_obscene_words(read_csv_words(csv_file)),
+                [()],
+                len(new_words),
+            )
+            dictionary_size = ObsceneWord.objects.count()
+            self.write("import_csv", import_result, dictionary_size=dictionary_size, imported_words=len(new_words))
+
+            for backend_name in options["backends"].split(","):
+                self.benchmark_backend(backend_name, dictionary_size, dictionary_words, texts, options)
+
+    def benchmark_backend(self, backend_name: str, dictionary_size: int, dictionary_words: List[str], texts, options):
+        params = {"backend": backend_name, "dictionary_size": dictionary_size}
+        service = ObscenityFilterService(
+            backend=get_backend(backend_name),
+            prefilter=DictionaryPrefilter() if options["prefilter"] else None,
+            verdict_cache_size=100000 if options["cache"] else 0,
+        )
+        # dictionary version, in-memory index and prefilter are loaded before measurements
+        self.write("warmup", self.measure(service.is_word_obscene, [(dictionary_words[0],)]), **params)
+
+        word_calls = options["word_calls"]
+        obscene_words = self.rng.sample(dictionary_words, min(word_calls, len(dictionary_words)))
+        clean_words = generate_words(word_calls, TEXT_CONSONANTS, self.rng)
+        for kind, words in (("obscene", obscene_words), ("clean", clean_words)):
+            result = self.measure(service.is_word_obscene, [(word,) for word in words])
+            self.write("is_word_obscene", result, words=kind, **params)
+
+        for length, text in texts.items():
+            calls = [(text,)] * options["text_calls"]
+            result = self.measure(service.is_text_obscene, calls, length)
+            self.write("is_text_obscene", result, text_words=length, **params)
+            if length <= options["similar_words_max_text"]:
+                result = self.measure(service.get_similar_words, calls, length)
+                self.write("get_similar_words", result, text_words=length, **params)
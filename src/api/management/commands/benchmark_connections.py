@@ -0,0 +1,102 @@
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+
+from api.internal.obscenity_filter.services.backends import get_backend
+from api.internal.obscenity_filter.services.obscenity_filter import ObscenityFilterService
+from api.management.commands.benchmark import generate_text
+
+
+def get_percentile(latencies: list, percentile: float) -> float:
+    return latencies[min(int(len(latencies) * percentile), len(latencies) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures per-request latency of text checks made by concurrent threads with current database connection "
+        "settings (DB_CONN_MAX_AGE, DB_POOL, DB_PREPARED_STATEMENTS), run it with different settings to compare them. "
+        "Every check is wrapped like a request: old connections are closed before and after it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent requests")
+        parser.add_argument("--requests", type=int, default=200, help="Requests made by every thread")
+        parser.add_argument("--text-words", type=int, default=20, help="Words in every checked text")
+        parser.add_argument("--backend", default="postgres", help="Matching backend")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Append results to this JSONL file instead of stdout")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        requests_count = options["threads"] * options["requests"]
+        texts = [generate_text(options["text_words"], rng) for _ in range(requests_count)]
+        # verdicts are not cached, so every request queries the backend
+        service = ObscenityFilterService(backend=get_backend(options["backend"]), verdict_cache_size=0)
+        service.is_text_obscene(texts[0])
+
+        opened_connections = []
+        lock = threading.Lock()
+
+        def count_connection(**kwargs):
+            with lock:
+                opened_connections.append(1)
+
+        def check(text: str) -> float:
+            # the same connection handling as in request_started and request_finished signals
+            started_at = time.perf_counter()
+            close_old_connections()
+            service.is_text_obscene(text)
+            close_old_connections()
+            return time.perf_counter() - started_at
+
+        def run_thread(thread_texts: list) -> list:
+            try:
+                return [check(text) for text in thread_texts]
+            finally:
+                connections.close_all()
+
+        connection_created.connect(count_connection)
+        try:
+            started_at = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+                thread_latencies = executor.map(
+                    run_thread, [texts[i::options["threads"]] for i in range(options["threads"])]
+                )
+                latencies = sorted(latency for latencies in thread_latencies for latency in latencies)
+            elapsed = time.perf_counter() - started_at
+        finally:
+            connection_created.disconnect(count_connection)
+
+        database = settings.DATABASES["default"]
+        result = {
+            "run": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "benchmark": "connections",
+            "backend": options["backend"],
+            "conn_max_age": database["CONN_MAX_AGE"],
+            "pool": bool(database["OPTIONS"].get("pool")),
+            "prepared_statements": bool(database["OPTIONS"].get("server_side_binding")),
+            "threads": options["threads"],
+            "requests": requests_count,
+            "text_words": options["text_words"],
+            "requests_per_second": requests_count / max(elapsed, 1e-9),
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "p50_ms": get_percentile(latencies, 0.5) * 1000,
+            "p95_ms": get_percentile(latencies, 0.95) * 1000,
+            "p99_ms": get_percentile(latencies, 0.99) * 1000,
+            "connections_per_request": len(opened_connections) / requests_count,
+        }
+        if options["output"]:
+            with open(options["output"], "a", encoding="utf-8") as output:
+                output.write(json.dumps(result) + "\n")
+        else:
+            sys.stdout.write(json.dumps(result) + "\n")
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.internal.obscenity_filter.models import ObsceneWord
+from api.internal.obscenity_filter.services.dictionary_version import get_dictionary_version
+from api.internal.obscenity_filter.services.snapshot import write_snapshot
+from config.settings import DICTIONARY_SNAPSHOT_PATH
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes obscene words dictionary to a memory-mappable snapshot file, "
+        "in-memory structures of workers are loaded from it while its version is current"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=DICTIONARY_SNAPSHOT_PATH,
+            help="Snapshot path, DICTIONARY_SNAPSHOT_PATH by default",
+        )
+
+    def handle(self, *args, **options):
+        if not options["output"]:
+            raise CommandError("Snapshot path is not set, pass --output or set DICTIONARY_SNAPSHOT_PATH")
+        started_at = time.monotonic()
+        with transaction.atomic():
+            # the version is read before words, words changed meanwhile bump the version past the snapshot one
+            # and the snapshot is treated as stale
+            dictionary_version = get_dictionary_version()
+            entries = ObsceneWord.objects.values_list("value", "normalized_value", "similarity").iterator()
+            written = write_snapshot(options["output"], entries, dictionary_version)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{written} words of dictionary version {dictionary_version} written to {options['output']} "
+                f"in {time.monotonic() - started_at:.1f}s"
+            )
+        )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.internal.obscenity_filter.app import obscenity_filter_service
+from api.internal.obscenity_filter.services.importer import read_csv_words
+from config.settings import IMPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Imports obscene words from a csv file, every cell of the file is a word"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to csv file")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Words upserted in one query")
+        parser.add_argument("--encoding", default="utf-8")
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+
+        def progress(imported):
+            elapsed = time.monotonic() - started_at
+            self.stdout.write(f"Imported {imported} words, {imported / max(elapsed, 1e-6):.0f} words/s")
+
+        with open(options["path"], encoding=options["encoding"], newline="") as csv_file:
+            imported, skipped = obscenity_filter_service.import_obscene_words(
+                read_csv_words(csv_file), chunk_size=options["chunk_size"], progress=progress
+            )
+        self.stdout.write(self.style.SUCCESS(f"{imported} words imported in {time.monotonic() - started_at:.1f}s"))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"{skipped} too long words were skipped"))
@@ -0,0 +1,167 @@
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from api.management.commands.benchmark_connections import get_percentile
+
+DEFAULT_PATHS = "/api/text/,/api/text/obscene-words"
+
+
+class ReplayRequest(NamedTuple):
+    path: str
+    body: bytes
+
+
+class ReplayResult(NamedTuple):
+    path: str
+    status: int
+    seconds: float
+    queries: Optional[int]
+
+
+def read_requests(path: str, paths: List[str], limit: Optional[int]) -> List[ReplayRequest]:
+    """
+    Reads a JSONL file, every line is a request body which is sent to every path,
+    or {"path": ..., "body": ...} which is sent to its own path.
+    """
+    requests = []
+    with open(path, encoding="utf-8") as requests_file:
+        for line_number, line in enumerate(requests_file, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise CommandError(f"Line {line_number} is not valid JSON: {e}")
+            if isinstance(item, dict) and "path" in item and "body" in item:
+                requests.append(ReplayRequest(item["path"], json.dumps(item["body"]).encode()))
+            else:
+                body = json.dumps(item).encode()
+                requests.extend(ReplayRequest(request_path, body) for request_path in paths)
+            if limit and len(requests) >= limit:
+                return requests[:limit]
+    return requests
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays request bodies from a JSONL file against the API in-process through Django test client "
+        "or against a running server, reports throughput, latency percentiles and database queries per path"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file of request bodies")
+        parser.add_argument("--paths", default=DEFAULT_PATHS, help="Comma separated API paths every body is sent to")
+        parser.add_argument(
+            "--url", help="Base url of a running server, e.g. http://localhost:8000. In-process if omitted"
+        )
+        parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+        parser.add_argument("--rate", type=float, default=0, help="Requests per second in total, unlimited if 0")
+        parser.add_argument("--repeat", type=int, default=1, help="Times the file is replayed")
+        parser.add_argument("--limit", type=int, help="Replay only the first requests of the file")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Timeout of a request to a server")
+        parser.add_argument("--output", help="Append results to this JSONL file instead of stdout")
+
+    def handle(self, *args, **options):
+        paths = [path.strip() for path in options["paths"].split(",") if path.strip()]
+        requests = read_requests(options["path"], paths, options["limit"]) * options["repeat"]
+        if not requests:
+            raise CommandError(f"There are no requests in {options['path']}")
+        self.url = options["url"].rstrip("/") if options["url"] else None
+        self.timeout = options["timeout"]
+        self._local = threading.local()
+
+        rate = options["rate"]
+        started_at = time.perf_counter()
+
+        def replay(item) -> ReplayResult:
+            request_id, request = item
+            # with a rate, latency is counted from the scheduled start, so a slow server can't hide
+            # its latency by delaying next requests
+            scheduled_at = started_at + request_id / rate if rate else time.perf_counter()
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            return self.send(request, scheduled_at)
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"], initializer=self._init_thread) as executor:
+            results = list(executor.map(replay, enumerate(requests)))
+        elapsed = time.perf_counter() - started_at
+
+        run = {
+            "run": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "benchmark": "replay",
+            "target": self.url or "in-process",
+            "concurrency": options["concurrency"],
+            "rate": rate,
+        }
+        output = open(options["output"], "a", encoding="utf-8") if options["output"] else sys.stdout
+        try:
+            for path in dict.fromkeys(result.path for result in results):
+                path_results = [result for result in results if result.path == path]
+                output.write(json.dumps({**run, "path": path, **self.summarize(path_results, elapsed)}) + "\n")
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+    def _init_thread(self):
+        if not self.url:
+            self._local.client = Client(SERVER_NAME="localhost", raise_request_exception=False)
+
+    def send(self, request: ReplayRequest, started_at: float) -> ReplayResult:
+        if self.url:
+            http_request = urllib.request.Request(
+                self.url + request.path,
+                data=request.body,
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except (urllib.error.URLError, OSError):
+                status = 0
+            return ReplayResult(request.path, status, time.perf_counter() - started_at, None)
+
+        # test client doesn't close connections on request start and finish, it is done like in a server
+        close_old_connections()
+        with CaptureQueriesContext(connection) as queries:
+            response = self._local.client.post(request.path, data=request.body, content_type="application/json")
+            if response.streaming:
+                b"".join(response.streaming_content)
+        close_old_connections()
+        return ReplayResult(request.path, response.status_code, time.perf_counter() - started_at, len(queries))
+
+    @staticmethod
+    def summarize(results: List[ReplayResult], elapsed: float) -> dict:
+        latencies = sorted(result.seconds for result in results)
+        queries = [result.queries for result in results if result.queries is not None]
+        statuses = Counter(result.status for result in results)
+        return {
+            "requests": len(results),
+            # failed requests are server errors and requests without response
+            "errors": sum(count for status, count in statuses.items() if status == 0 or status >= 500),
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "requests_per_second": len(results) / max(elapsed, 1e-9),
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "p50_ms": get_percentile(latencies, 0.5) * 1000,
+            "p95_ms": get_percentile(latencies, 0.95) * 1000,
+            "p99_ms": get_percentile(latencies, 0.99) * 1000,
+            "queries_per_request": statistics.fmean(queries) if queries else None,
+        }
@@ -0,0 +1,152 @@
+import csv
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from typing import Iterator, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.internal.obscenity_filter.app import create_obscenity_filter_service
+from api.internal.obscenity_filter.services.backends import InMemoryTrigramBackend
+from api.internal.obscenity_filter.services.importer import chunked
+
+_worker_service = None
+
+
+def init_worker():
+    """
+    Builds a service configured like the API one with its own warmed in-memory copy of the dictionary
+    in every worker process. Historical texts are not sent to suspicious words search.
+    """
+    global _worker_service
+    _worker_service = create_obscenity_filter_service(backend=InMemoryTrigramBackend(), suspicious_words_check=False)
+    _worker_service.warmup()
+
+
+def scan_records(records: List[dict]) -> List[Tuple[bool, str]]:
+    """
+    Returns verdict and output line of every record.
+    """
+    obscene_words = _worker_service.get_texts_obscene_words([record.pop("text") for record in records])
+    return [
+        (
+            bool(words),
+            json.dumps({**record, "is_obscene": bool(words), "matched_words": words}, ensure_ascii=False) + "\n",
+        )
+        for record, words in zip(records, obscene_words)
+    ]
+
+
+def prepare_output(path: str, resume: bool) -> int:
+    """
+    Returns number of records already written to the output file.
+    An incomplete last line left by an interruption is cut off.
+    """
+    if not resume or not os.path.exists(path):
+        open(path, "w").close()
+        return 0
+    lines, complete_length, position = 0, 0, 0
+    with open(path, "rb+") as output_file:
+        while block := output_file.read(1024 * 1024):
+            if (last_line_end := block.rfind(b"\n")) >= 0:
+                lines += block.count(b"\n")
+                complete_length = position + last_line_end + 1
+            position += len(block)
+        output_file.truncate(complete_length)
+    return lines
+
+
+def imap_bounded(pool, func, iterable, max_pending: int):
+    """
+    Like Pool.imap, but doesn't read more than max_pending items ahead, so a huge input isn't loaded to memory.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+class Command(BaseCommand):
+    help = "Checks every record of a JSONL or CSV corpus and writes verdicts with matched obscene words as JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="Path to JSONL or CSV file")
+        parser.add_argument("output", help="Path to output JSONL file")
+        parser.add_argument("--format", choices=["jsonl", "csv"], help="Input format, by default by file extension")
+        parser.add_argument("--text-field", default="text", help="Field or column with a text")
+        parser.add_argument("--id-field", help="Field or column copied to output records to identify them")
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count(), help="Worker processes, 0 to scan in this process"
+        )
+        parser.add_argument("--chunk-size", type=int, default=500, help="Records sent to a worker at once")
+        parser.add_argument("--resume", action="store_true", help="Continue after records found in output")
+        parser.add_argument("--report-every", type=int, default=100000, help="Report throughput every N records")
+
+    def read_records(self, options) -> Iterator[dict]:
+        input_format = options["format"] or ("csv" if options["input"].endswith(".csv") else "jsonl")
+        text_field, id_field = options["text_field"], options["id_field"]
+        with open(options["input"], encoding="utf-8", newline="") as input_file:
+            if input_format == "csv":
+                rows = csv.DictReader(input_file)
+            else:
+                rows = (json.loads(line) for line in input_file if line.strip())
+            for line, row in enumerate(rows):
+                if text_field not in row:
+                    raise CommandError(f"Record {line} has no field {text_field!r}")
+                record = {"line": line, "text": row[text_field] or ""}
+                if id_field:
+                    record["id"] = row.get(id_field)
+                yield record
+
+    def handle(self, *args, **options):
+        skip = prepare_output(options["output"], options["resume"])
+        if skip:
+            self.stdout.write(f"Resuming after {skip} records")
+
+        records = self.read_records(options)
+        for _ in range(skip):
+            next(records, None)
+        chunks = chunked(records, options["chunk_size"])
+
+        started_at = time.monotonic()
+        scanned, reported, obscene = 0, 0, 0
+        pool = None
+        if options["processes"] > 0:
+            # forked workers must open their own database connections
+            connections.close_all()
+            pool = multiprocessing.Pool(options["processes"], initializer=init_worker)
+            results = imap_bounded(pool, scan_records, chunks, max_pending=options["processes"] * 4)
+        else:
+            init_worker()
+            results = map(scan_records, chunks)
+
+        try:
+            with open(options["output"], "a", encoding="utf-8") as output_file:
+                for verdicts in results:
+                    output_file.writelines(line for _, line in verdicts)
+                    output_file.flush()
+                    scanned += len(verdicts)
+                    obscene += sum(is_obscene for is_obscene, _ in verdicts)
+                    if scanned - reported >= options["report_every"]:
+                        reported = scanned
+                        self.report(scanned, obscene, started_at)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        self.report(scanned, obscene, started_at)
+        self.stdout.write(self.style.SUCCESS(f"Verdicts of {skip + scanned} records are in {options['output']}"))
+
+    def report(self, scanned, obscene, started_at):
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(
+            f"Scanned {scanned} records ({obscene} obscene) in {elapsed:.1f}s, "
+            f"{scanned / max(elapsed, 1e-6):.0f} records/s"
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+def create_dictionary_version(apps, schema_editor):
+    DictionaryVersion = apps.get_model("api", "DictionaryVersion")
+    DictionaryVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DictionaryVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Dictionary version',
+                'verbose_name_plural': 'Dictionary versions',
+            },
+        ),
+        migrations.RunPython(create_dictionary_version, migrations.RunPython.noop),
+    ]
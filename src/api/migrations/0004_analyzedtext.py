@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_dictionaryversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyzedText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_hash', models.CharField(max_length=64, unique=True, verbose_name='Normalized text hash')),
+                ('tokens_hash', models.CharField(db_index=True, max_length=64, verbose_name='Token set hash')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'Analyzed text',
+                'verbose_name_plural': 'Analyzed texts',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:10
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_analyzedtext'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='obsceneword',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['normalized_value'], name='obscene_word_value_gist', opclasses=['gist_trgm_ops']),
+        ),
+    ]
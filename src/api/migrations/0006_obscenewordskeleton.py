@@ -0,0 +1,93 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:40
+
+import re
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 1000
+
+# normalization and folding as they were when skeletons were introduced,
+# the migration doesn't change when the service changes
+NON_WORD_RE = re.compile(r"[^\w\dа-яА-ЯёЁ]", flags=re.UNICODE)
+CYRILLIC_RE = re.compile(r"[а-яА-ЯёЁ]")
+REPEATING_CHARACTERS_RE = re.compile(r"(.)\1+")
+TRANSLATION_TABLE = str.maketrans(
+    {
+        "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z", "и": "i", "й": "j",
+        "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+        "ф": "f", "х": "kh", "ц": "c", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "",
+        "э": "e", "ю": "yu", "я": "ya", "ё": "e",
+    }
+)
+NUMBERS_TO_LETTERS_TABLE = str.maketrans(
+    {"0": "о", "1": "и", "3": "з", "4": "ч", "5": "s", "6": "б", "7": "г", "8": "В"}
+)
+SIMILAR_LATIN_TO_CYRILLIC_TABLE = str.maketrans(
+    {
+        "y": "у", "e": "е", "o": "о", "p": "р", "a": "а", "k": "к", "x": "х", "c": "с", "E": "E", "T": "Т",
+        "O": "О", "P": "Р", "А": "А", "H": "Н", "K": "К", "X": "Х", "C": "C", "B": "В", "M": "М", "n": "п",
+    }
+)
+
+
+def normalize(word):
+    return NON_WORD_RE.sub("", word).lower().strip().translate(TRANSLATION_TABLE)
+
+
+def collapse(word):
+    return REPEATING_CHARACTERS_RE.sub(r"\1", word)
+
+
+def get_skeletons(word):
+    folded_word = word.translate(NUMBERS_TO_LETTERS_TABLE)
+    if CYRILLIC_RE.search(folded_word):
+        folded_word = folded_word.translate(SIMILAR_LATIN_TO_CYRILLIC_TABLE)
+    skeletons = dict.fromkeys(
+        [
+            collapse(normalize(folded_word)),
+            normalize(collapse(word)),
+            normalize(word.translate(NUMBERS_TO_LETTERS_TABLE)),
+            normalize(word.translate(SIMILAR_LATIN_TO_CYRILLIC_TABLE)),
+        ]
+    )
+    skeletons.pop("", None)
+    return list(skeletons)
+
+
+def create_skeletons(apps, schema_editor):
+    ObsceneWord = apps.get_model("api", "ObsceneWord")
+    ObsceneWordSkeleton = apps.get_model("api", "ObsceneWordSkeleton")
+    skeletons = []
+    for word_id, value in ObsceneWord.objects.values_list("id", "value").iterator(chunk_size=CHUNK_SIZE):
+        skeletons.extend(ObsceneWordSkeleton(word_id=word_id, value=skeleton) for skeleton in get_skeletons(value))
+        if len(skeletons) >= CHUNK_SIZE:
+            ObsceneWordSkeleton.objects.bulk_create(skeletons, ignore_conflicts=True)
+            skeletons = []
+    ObsceneWordSkeleton.objects.bulk_create(skeletons, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_obsceneword_gist_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObsceneWordSkeleton',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=1023, verbose_name='Skeleton value')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skeletons', to='api.obsceneword', verbose_name='Word')),
+            ],
+            options={
+                'verbose_name': 'Obscene word skeleton',
+                'verbose_name_plural': 'Obscene word skeletons',
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['value'], name='obscene_word_skeleton_value', opclasses=['gin_trgm_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('word', 'value'), name='obscene_word_skeleton_unique')],
+            },
+        ),
+        migrations.RunPython(create_skeletons, migrations.RunPython.noop),
+    ]
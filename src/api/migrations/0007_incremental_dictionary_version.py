@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_obscenewordskeleton'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='obsceneword',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, verbose_name='Dictionary version'),
+        ),
+        migrations.AddField(
+            model_name='dictionaryversion',
+            name='reset_version',
+            field=models.BigIntegerField(default=0, verbose_name='Reset version'),
+        ),
+    ]
@@ -9,15 +9,51 @@ env = environ.Env(
     POSTGRES_DB=(str, "postgres"),
     POSTGRES_USER=(str, "postgres"),
     POSTGRES_PASSWORD=(str, "postgres"),
+    DB_CONN_MAX_AGE=(int, 0),
+    DB_POOL=(bool, False),
+    DB_POOL_MIN_SIZE=(int, 2),
+    DB_POOL_MAX_SIZE=(int, 10),
+    DB_POOL_TIMEOUT=(float, 10.0),
+    DB_PREPARED_STATEMENTS=(bool, False),
+    DB_PREPARE_THRESHOLD=(int, 1),
     DEBUG=(bool, False),
     ALLOWED_HOSTS=(str, ""),
     API_VERSION=(str, "0.0.1"),
     ADMIN_API_VERSION=(str, "admin 0.0.1"),
     TEMP_FILE_PATH=(str, "/src/files_output/"),
     OBSCENITY_INDICATOR=(float, 0.4),
+    OBSCENITY_BACKEND=(str, "postgres"),
+    OBSCENITY_PREFILTER=(bool, False),
+    OBSCENITY_COMPOUND_CHECK=(bool, False),
+    MAX_TRANSFORMATION_CHAIN=(int, 3),
+    VARIANT_BUDGET=(int, 8),
+    COMPOUND_MIN_LENGTH=(int, 4),
+    VERDICT_CACHE_SIZE=(int, 100000),
+    VERDICT_CACHE_TTL=(int, 600),
+    ASYNC_API=(bool, False),
+    IMPORT_CHUNK_SIZE=(int, 5000),
+    BATCH_MAX_TEXTS=(int, 1000),
+    BATCH_MAX_BODY_SIZE=(int, 1024 * 1024),
+    SIMILAR_WORDS_MAX_LIMIT=(int, 100),
+    CENSOR_STREAM_CHUNK_SIZE=(int, 10000),
+    METRICS_ENABLED=(bool, False),
+    METRICS_DIR=(str, ""),
+    METRICS_FLUSH_INTERVAL=(float, 5.0),
+    DICTIONARY_SNAPSHOT_PATH=(str, ""),
+    SHARED_VERDICT_CACHE=(bool, False),
+    SHARED_VERDICT_CACHE_BACKEND=(str, "django.core.cache.backends.locmem.LocMemCache"),
+    SHARED_VERDICT_CACHE_LOCATION=(str, "obscenity-verdicts"),
+    SHARED_VERDICT_CACHE_MAX_ENTRIES=(int, 100000),
+    SHARED_VERDICT_CACHE_TTL=(int, 600),
+    SHARED_VERDICT_CACHE_VERSION_TTL=(int, 5),
+    SHARED_VERDICT_CACHE_LOCK_TIMEOUT=(float, 5.0),
     SUSPICIOUS_WORDS_CHECK=(bool, False),
     CHATGPT_API_KEY=(str, ""),
-    CHATGPT_BASE_URL=(str, None)
+    CHATGPT_BASE_URL=(str, None),
+    SUSPICIOUS_WORDS_QUEUE_SIZE=(int, 10000),
+    SUSPICIOUS_WORDS_PROMPT_TOKENS=(int, 2000),
+    SUSPICIOUS_WORDS_RECENT_TEXTS=(int, 10000),
+    MODERATION_MAX_WORDS=(int, 10000),
 )
 
 SECRET_KEY = env("SECRET_KEY")
@@ -58,6 +94,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.internal.metrics.MetricsMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -92,8 +129,24 @@ DATABASES = {
         "PASSWORD": env("POSTGRES_PASSWORD"),
         "HOST": env("POSTGRES_HOST"),
         "PORT": 5432,
+        # a pool keeps connections itself, Django closes pooled connections after every request
+        "CONN_MAX_AGE": 0 if env("DB_POOL") else env("DB_CONN_MAX_AGE"),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
+# pool and prepared statements are options of psycopg 3
+if env("DB_POOL"):
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": env("DB_POOL_MIN_SIZE"),
+        "max_size": env("DB_POOL_MAX_SIZE"),
+        "timeout": env("DB_POOL_TIMEOUT"),
+    }
+if env("DB_PREPARED_STATEMENTS"):
+    # parameters must be sent separately from the query, so the same query text is prepared once per connection
+    # and executed by hot lookups without planning
+    DATABASES["default"]["OPTIONS"]["server_side_binding"] = True
+    DATABASES["default"]["OPTIONS"]["prepare_threshold"] = env("DB_PREPARE_THRESHOLD")
 
 
 # Password validation
@@ -139,7 +192,54 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 OBSCENITY_INDICATOR = env("OBSCENITY_INDICATOR")
+OBSCENITY_BACKEND = env("OBSCENITY_BACKEND")
+OBSCENITY_PREFILTER = env("OBSCENITY_PREFILTER")
+OBSCENITY_COMPOUND_CHECK = env("OBSCENITY_COMPOUND_CHECK")
+MAX_TRANSFORMATION_CHAIN = env("MAX_TRANSFORMATION_CHAIN")
+VARIANT_BUDGET = env("VARIANT_BUDGET")
+COMPOUND_MIN_LENGTH = env("COMPOUND_MIN_LENGTH")
+VERDICT_CACHE_SIZE = env("VERDICT_CACHE_SIZE")
+VERDICT_CACHE_TTL = env("VERDICT_CACHE_TTL")
+
+ASYNC_API = env("ASYNC_API")
+
+IMPORT_CHUNK_SIZE = env("IMPORT_CHUNK_SIZE")
+
+BATCH_MAX_TEXTS = env("BATCH_MAX_TEXTS")
+BATCH_MAX_BODY_SIZE = env("BATCH_MAX_BODY_SIZE")
+
+SIMILAR_WORDS_MAX_LIMIT = env("SIMILAR_WORDS_MAX_LIMIT")
+
+CENSOR_STREAM_CHUNK_SIZE = env("CENSOR_STREAM_CHUNK_SIZE")
+
+METRICS_ENABLED = env("METRICS_ENABLED")
+METRICS_DIR = env("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = env("METRICS_FLUSH_INTERVAL")
+DICTIONARY_SNAPSHOT_PATH = env("DICTIONARY_SNAPSHOT_PATH")
+SHARED_VERDICT_CACHE = env("SHARED_VERDICT_CACHE")
+SHARED_VERDICT_CACHE_ALIAS = "verdicts"
+SHARED_VERDICT_CACHE_TTL = env("SHARED_VERDICT_CACHE_TTL")
+SHARED_VERDICT_CACHE_VERSION_TTL = env("SHARED_VERDICT_CACHE_VERSION_TTL")
+SHARED_VERDICT_CACHE_LOCK_TIMEOUT = env("SHARED_VERDICT_CACHE_LOCK_TIMEOUT")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    SHARED_VERDICT_CACHE_ALIAS: {
+        "BACKEND": env("SHARED_VERDICT_CACHE_BACKEND"),
+        "LOCATION": env("SHARED_VERDICT_CACHE_LOCATION"),
+        "TIMEOUT": SHARED_VERDICT_CACHE_TTL,
+    },
+}
+# Redis and Memcached bound their memory by their own eviction policies
+if not any(name in env("SHARED_VERDICT_CACHE_BACKEND") for name in ("redis", "memcached")):
+    CACHES[SHARED_VERDICT_CACHE_ALIAS]["OPTIONS"] = {"MAX_ENTRIES": env("SHARED_VERDICT_CACHE_MAX_ENTRIES")}
 
 SUSPICIOUS_WORDS_CHECK = env("SUSPICIOUS_WORDS_CHECK")
 CHATGPT_API_KEY = env("CHATGPT_API_KEY")
 CHATGPT_BASE_URL = env("CHATGPT_BASE_URL")
+SUSPICIOUS_WORDS_QUEUE_SIZE = env("SUSPICIOUS_WORDS_QUEUE_SIZE")
+SUSPICIOUS_WORDS_PROMPT_TOKENS = env("SUSPICIOUS_WORDS_PROMPT_TOKENS")
+SUSPICIOUS_WORDS_RECENT_TEXTS = env("SUSPICIOUS_WORDS_RECENT_TEXTS")
+MODERATION_MAX_WORDS = env("MODERATION_MAX_WORDS")
@@ -0,0 +1,49 @@
+import gc
+
+import environ
+
+env = environ.Env(GUNICORN_PRELOAD=(bool, True))
+
+# the app is loaded and warmed up once in the master process, workers share it copy-on-write.
+# Set GUNICORN_PRELOAD=False with --reload, code can't be reloaded in workers of a preloaded app
+preload_app = env("GUNICORN_PRELOAD")
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    from api.internal.obscenity_filter.app import obscenity_filter_service
+
+    # the master keeps running if the database isn't available yet, workers retry warmup
+    obscenity_filter_service.try_warmup()
+    # workers must open their own database connections, a connection pool with its threads must not be forked too
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        if connection.settings_dict["OPTIONS"].get("pool"):
+            connection.close_pool()
+    # loaded objects are moved out of garbage collector generations,
+    # so collections in workers don't touch their pages and don't copy them
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    from api.internal.obscenity_filter.app import obscenity_filter_service
+
+    # a failed warmup doesn't stop the worker, readiness probe reports 503 and retries it
+    if not obscenity_filter_service.is_warmed_up:
+        obscenity_filter_service.try_warmup()
+
+
+def worker_exit(server, worker):
+    from api.internal.obscenity_filter.services.metrics import metrics
+
+    metrics.flush()
+
+
+def child_exit(server, worker):
+    from api.internal.obscenity_filter.services.metrics import metrics
+
+    # values of the exited worker are kept in totals, the file of every restarted worker is not left behind
+    metrics.mark_process_dead(worker.pid)
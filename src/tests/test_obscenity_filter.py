@@ -1,14 +1,50 @@
+import asyncio
+import io
+import json
+import re
+import threading
+import time
+import timeit
+from types import SimpleNamespace
+
 import pytest
 
-from api.internal.obscenity_filter.models import ObsceneWord
-from api.internal.obscenity_filter.services.obscenity_filter import ObscenityFilterService
+from api.internal.obscenity_filter.models import ObsceneWord, ObsceneWordSkeleton, SuspiciousWord
+from api.internal.obscenity_filter.services.backends import get_backend, InMemoryTrigramBackend, \
+    PostgresTrigramBackend, TrigramIndex
+from api.internal.obscenity_filter.services.obscenity_filter import ObsceneSpan, ObscenityFilterService
+from api.internal.obscenity_filter.services.aho_corasick import AhoCorasickAutomaton
+from api.internal.obscenity_filter.services.compound import CompoundDetector
+from api.internal.obscenity_filter.services.importer import read_csv_words
+from api.internal.obscenity_filter.services.metrics import metrics, MetricsRegistry, NULL_TIMER
+from api.internal.obscenity_filter.services.prefilter import DictionaryPrefilter
+from api.internal.obscenity_filter.services.snapshot import DictionarySnapshot, open_snapshot, write_snapshot
+from api.internal.obscenity_filter.services.suspicious_words import SuspiciousWordsCollector
+from api.internal.obscenity_filter.services.tokenizer import split_text, tokenize
 from api.internal.obscenity_filter.services.transfromations import collapse_repeating_characters, \
-    replace_numbers_to_letters, replace_similar_latin_to_cyrillic
+    replace_numbers_to_letters, replace_similar_latin_to_cyrillic, SIMILAR_LATIN_TO_CYRILLIC_TABLE, \
+    NUMBERS_TO_LETTERS_TABLE, DEFAULT_TRANSFORMATIONS, fold_word, get_skeletons, TransformationPipeline
+from api.internal.obscenity_filter.services.trigrams import get_trigrams, similarity
+from api.internal.obscenity_filter.services.verdict_cache import MISSING, VerdictCache
+
+
+@pytest.fixture(params=["postgres", "memory", "skeleton", "postgres+prefilter"])
+def obscenity_filter_service(db, request):
+    backend_name, _, prefilter = request.param.partition("+")
+    return ObscenityFilterService(
+        obscenity_indicator=0.6,
+        backend=get_backend(backend_name),
+        prefilter=DictionaryPrefilter() if prefilter else None,
+    )
 
 
 @pytest.fixture
-def obscenity_filter_service(db):
-    return ObscenityFilterService(obscenity_indicator=0.6)
+def app_obscenity_filter_service(db):
+    from api.internal.obscenity_filter.app import obscenity_filter_service
+
+    # drop verdicts cached by previous tests, their dictionary changes were rolled back
+    obscenity_filter_service.dictionary_changed()
+    return obscenity_filter_service
 
 
 @pytest.fixture
@@ -85,6 +121,7 @@ def test_replace_similar_latin_to_cyrillic(word, transformed_word):
         ("Бананы", True),
         ("Бaнaн", True),  # english a
         ("Ябл0ки", True),
+        ("Ябл00кко", True),  # digits and repeated letters
         ("Барбарики", False),
         ("Помидор", False),
         ("Грушевидный", False),
@@ -103,3 +140,1105 @@ def test_is_word_obscene(fill_obscene_words, obscenity_filter_service, word, is_
 )
 def test_is_text_obscene(fill_obscene_words, obscenity_filter_service, text, is_text_obscene):
     assert is_text_obscene == obscenity_filter_service.is_text_obscene(text)
+
+
+@pytest.mark.parametrize(
+    "value, trigrams",
+    [
+        ("word", {"  w", " wo", "wor", "ord", "rd "}),
+        ("a", {"  a", " a "}),
+        ("Ab-c", {"  a", " ab", "ab ", "  c", " c "}),
+        ("", set()),
+    ],
+)
+def test_get_trigrams(value, trigrams):
+    assert trigrams == get_trigrams(value)
+
+
+@pytest.mark.parametrize(
+    "first, second, expected_similarity",
+    [
+        ("word", "two words", 0.36363637),
+        ("banan", "banan", 1.0),
+        ("banan", "", 0.0),
+    ],
+)
+def test_similarity_matches_pg_trgm(first, second, expected_similarity):
+    assert similarity(first, second) == pytest.approx(expected_similarity)
+
+
+@pytest.mark.parametrize(
+    "word",
+    ["Банан", "Банан0", "бУнан", "Бaнaн", "Ябл0ки", "Барбарики", "Грушевидный", "Гранаты", "Пиво"],
+)
+def test_backends_give_same_verdicts(fill_obscene_words, word):
+    postgres_service = ObscenityFilterService(obscenity_indicator=0.6, backend=get_backend("postgres"))
+    memory_service = ObscenityFilterService(obscenity_indicator=0.6, backend=get_backend("memory"))
+    assert postgres_service.is_word_obscene(word) == memory_service.is_word_obscene(word)
+
+    postgres_similar_words = postgres_service.get_similar_words(word, limit=2)[word]
+    memory_similar_words = memory_service.get_similar_words(word, limit=2)[word]
+    assert [w.calc_similarity for w in postgres_similar_words] == pytest.approx(
+        [w.calc_similarity for w in memory_similar_words]
+    )
+
+
+def test_created_obscene_word_is_found(obscenity_filter_service):
+    assert not obscenity_filter_service.is_word_obscene("Пиво")
+    obscenity_filter_service.create_obscene_word("Пиво")
+    assert obscenity_filter_service.is_word_obscene("Пиво")
+
+
+def test_text_is_checked_in_one_query(fill_obscene_words, django_assert_num_queries):
+    service = ObscenityFilterService(obscenity_indicator=0.6, backend=get_backend("postgres"), verdict_cache_size=0)
+    with django_assert_num_queries(1):
+        assert not service.is_text_obscene("Помидоры очень вкусные и сочные")
+
+
+@pytest.mark.parametrize("backend_name", ["postgres", "memory", "skeleton"])
+def test_backend_find_matches(fill_obscene_words, backend_name):
+    backend = get_backend(backend_name)
+    assert backend.find_matches(["banany", "pomidor", "grusha"], 0.6) == {"banany": "Банан", "grusha": "Груша"}
+
+
+def test_cached_verdicts_are_reused(fill_obscene_words, obscenity_filter_service, django_assert_num_queries):
+    assert obscenity_filter_service.is_text_obscene("Помидоры очень вкусные")
+    # only dictionary version is read
+    with django_assert_num_queries(1):
+        assert obscenity_filter_service.is_text_obscene("Помидоры очень вкусные")
+        assert obscenity_filter_service.is_word_obscene("Банан")
+
+
+def test_dictionary_change_in_other_worker_drops_cache(fill_obscene_words, obscenity_filter_service):
+    other_worker_service = ObscenityFilterService(obscenity_indicator=0.6, backend=get_backend("memory"))
+    assert not obscenity_filter_service.is_word_obscene("Пиво")
+    other_worker_service.create_obscene_word("Пиво")
+    assert obscenity_filter_service.is_word_obscene("Пиво")
+
+
+def test_verdict_cache_is_bounded():
+    cache = VerdictCache(maxsize=2, ttl=60)
+    cache.set("a", None)
+    cache.set("b", "Банан")
+    cache.get("a")
+    cache.set("c", None)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") is None
+
+
+def test_verdict_cache_drops_entries_of_old_version():
+    cache = VerdictCache(maxsize=2, ttl=60)
+    cache.sync_version(1)
+    cache.set("a", "Банан")
+    cache.sync_version(1)
+    assert cache.get("a") == "Банан"
+    cache.sync_version(2)
+    assert cache.get("a") is MISSING
+
+
+def test_verdict_cache_entries_expire():
+    cache = VerdictCache(maxsize=2, ttl=-1)
+    cache.set("a", "Банан")
+    assert cache.get("a") is MISSING
+
+
+def _uncompiled_word_variants(word):
+    """
+    Variants of a word calculated like before compilation of transformations and normalization:
+    tables and regexes are built on every call and every transformation result is normalized.
+    """
+    def normalize(value):
+        filtered_word = re.sub(r"[^\w\dа-яА-ЯёЁ]", "", value, flags=re.UNICODE)
+        return filtered_word.lower().strip().translate(str.maketrans(ObscenityFilterService.TRANSLATION_DICT))
+
+    transformations = [
+        lambda x: x,
+        lambda x: x.translate(str.maketrans({chr(k): v for k, v in NUMBERS_TO_LETTERS_TABLE.items()})),
+        lambda x: re.sub(r"(.)\1+", r"\1", x),
+        lambda x: x.translate(str.maketrans({chr(k): v for k, v in SIMILAR_LATIN_TO_CYRILLIC_TABLE.items()})),
+    ]
+    variants = dict.fromkeys(normalize(transformation(word)) for transformation in transformations)
+    variants.pop("", None)
+    return list(variants)
+
+
+BENCHMARK_WORDS = ["Бананы", "очень", "вкусные", "Ябл0ки", "Бaнaн", "ППиииввввооо", "Агент007", "Taпoк"] * 50
+
+
+def test_compiled_pipeline_gives_same_variants():
+    # single transformations, like before chains of transformations
+    service = ObscenityFilterService(max_transformation_chain=1, variant_budget=None)
+    for word in BENCHMARK_WORDS:
+        assert service.get_word_variants(word) == _uncompiled_word_variants(word)
+
+
+@pytest.mark.timing
+def test_compiled_pipeline_is_faster():
+    service = ObscenityFilterService(max_transformation_chain=1, variant_budget=None)
+    compiled_time = min(timeit.repeat(
+        lambda: [service.get_word_variants(word) for word in BENCHMARK_WORDS], number=20, repeat=3
+    ))
+    uncompiled_time = min(timeit.repeat(
+        lambda: [_uncompiled_word_variants(word) for word in BENCHMARK_WORDS], number=20, repeat=3
+    ))
+    assert compiled_time < uncompiled_time
+
+
+def test_composed_transformations():
+    service = ObscenityFilterService(max_transformation_chain=2, variant_budget=None)
+    variants = service.get_word_variants("Ябл00кко")
+    # single transformations go first
+    assert variants[:3] == ["yabl00kko", "yablookko", "yabl0ko"]
+    # digits are replaced, then repeats are collapsed
+    assert "yabloko" in variants
+    assert "yabloko" not in ObscenityFilterService(max_transformation_chain=1).get_word_variants("Ябл00кко")
+
+
+def test_variant_budget():
+    word = "Тaaп00кк"
+    pipeline = TransformationPipeline(DEFAULT_TRANSFORMATIONS, ObscenityFilterService().normalize_word, 3)
+    all_variants = pipeline.variants(word)
+    assert all_variants == ["taap00kk", "taapookk", "tap0k", "tapok"]
+    pipeline.variant_budget = 2
+    assert pipeline.variants(word) == all_variants[:2]
+
+
+def test_are_texts_obscene(fill_obscene_words, obscenity_filter_service):
+    texts = ["Бананы очень вкусные", "Помидоры очень вкусные", "", "Ябл0ки"]
+    assert obscenity_filter_service.are_texts_obscene(texts) == [True, False, False, True]
+
+
+def test_batch_check_streams_verdicts_in_order(app_obscenity_filter_service, fill_obscene_words, client):
+    response = client.post(
+        "/api/text/batch",
+        {"texts": ["Помидоры очень вкусные", "Бананы очень вкусные", "Груша"]},
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"index": 0, "is_obscene": False},
+        {"index": 1, "is_obscene": True},
+        {"index": 2, "is_obscene": True},
+    ]
+
+
+def test_batch_check_limits_number_of_texts(app_obscenity_filter_service, client):
+    from config.settings import BATCH_MAX_TEXTS
+
+    response = client.post(
+        "/api/text/batch", {"texts": ["Груша"] * (BATCH_MAX_TEXTS + 1)}, content_type="application/json"
+    )
+    assert response.status_code == 422
+
+
+def test_batch_check_rejects_large_body_before_parsing(client):
+    from config.settings import BATCH_MAX_BODY_SIZE, BATCH_MAX_TEXTS
+
+    texts = ["Груша" * 200] * (BATCH_MAX_TEXTS + 1)
+    assert len(json.dumps({"texts": texts})) > BATCH_MAX_BODY_SIZE
+    response = client.post("/api/text/batch", {"texts": texts}, content_type="application/json")
+    # the body is too large, so the number of texts is not validated
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize(
+    "text, is_text_obscene",
+    [
+        ("Бананы очень вкусные", True),
+        ("Помидоры очень вкусные", False),
+    ],
+)
+@pytest.mark.parametrize("backend_name", ["postgres", "memory"])
+def test_ais_text_obscene(transactional_db, backend_name, text, is_text_obscene):
+    service = ObscenityFilterService(obscenity_indicator=0.6, backend=get_backend(backend_name))
+    for word in ["Банан", "Яблоко", "Груша", "Гранат"]:
+        service.create_obscene_word(word)
+    assert is_text_obscene == asyncio.run(service.ais_text_obscene(text))
+    similar_words = asyncio.run(service.aget_similar_words(text))
+    assert list(similar_words) == text.split(" ")
+
+
+class SlowPostgresTrigramBackend(PostgresTrigramBackend):
+    """
+    Backend which spends some time waiting for "database" and never finds anything.
+    """
+
+    def is_any_obscene(self, normalized_words, obscenity_indicator):
+        time.sleep(0.05)
+        return False
+
+
+@pytest.mark.timing
+def test_async_checks_are_concurrent():
+    service = ObscenityFilterService(backend=SlowPostgresTrigramBackend(), verdict_cache_size=0)
+    texts = [f"Текст номер {i}" for i in range(10)]
+
+    start = time.monotonic()
+    for text in texts:
+        service.is_text_obscene(text)
+    sync_time = time.monotonic() - start
+
+    async def check_concurrently():
+        return await asyncio.gather(*(service.ais_text_obscene(text) for text in texts))
+
+    start = time.monotonic()
+    assert asyncio.run(check_concurrently()) == [False] * len(texts)
+    async_time = time.monotonic() - start
+
+    assert async_time < sync_time / 2
+
+
+class FakeGPTClient:
+    """
+    Local replacement of OpenAI client, answers with words which look like vegetables.
+    """
+
+    VEGETABLES = {"Помидоры", "Огурцы", "Морковь"}
+
+    def __init__(self):
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        words = [word for word in prompt.split() if word in self.VEGETABLES]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" ".join(words)))])
+
+
+def test_suspicious_words_are_collected_in_one_prompt(fill_obscene_words, obscenity_filter_service):
+    gpt_client = FakeGPTClient()
+    collector = SuspiciousWordsCollector(gpt_client, obscenity_filter_service.normalize_word, background=False)
+    obscenity_filter_service.suspicious_words_check = True
+    obscenity_filter_service.suspicious_words_collector = collector
+
+    assert not obscenity_filter_service.is_text_obscene("Помидоры очень вкусные")
+    assert not obscenity_filter_service.is_text_obscene("Огурцы тоже")
+    assert obscenity_filter_service.is_text_obscene("Бананы и Морковь")
+    assert not gpt_client.prompts
+
+    collector.drain()
+    assert len(gpt_client.prompts) == 1
+    assert set(SuspiciousWord.objects.values_list("value", flat=True)) == {"Помидоры", "Огурцы"}
+
+
+def test_suspicious_words_prompts_fit_token_budget(db):
+    gpt_client = FakeGPTClient()
+    collector = SuspiciousWordsCollector(
+        gpt_client, ObscenityFilterService().normalize_word, prompt_token_budget=10, background=False
+    )
+    for text in ["Помидоры очень вкусные", "Огурцы очень вкусные", "Морковь очень вкусная"]:
+        collector.submit(text)
+    collector.drain()
+    assert len(gpt_client.prompts) == 3
+    assert SuspiciousWord.objects.count() == 3
+
+
+@pytest.fixture
+def suspicious_texts_counts(monkeypatch):
+    from api.internal.obscenity_filter.services import suspicious_words
+
+    registry = MetricsRegistry(enabled=True, directory="")
+    monkeypatch.setattr(suspicious_words, "metrics", registry)
+
+    def get_counts():
+        return {
+            dict(labels)["result"]: value
+            for (name, labels), value in registry.collect()[1].items()
+            if name == "obscenity_suspicious_texts_total"
+        }
+
+    return get_counts
+
+
+def test_suspicious_words_queue_sheds_load(suspicious_texts_counts):
+    collector = SuspiciousWordsCollector(
+        FakeGPTClient(), ObscenityFilterService().normalize_word, queue_size=2, background=False
+    )
+    assert collector.submit("Помидоры")
+    assert collector.submit("Огурцы")
+    assert not collector.submit("Морковь")
+    assert suspicious_texts_counts() == {"submitted": 3, "dropped": 1}
+    collector.drain()
+    # a dropped text is not a duplicate, it is queued when it is submitted again
+    assert collector.submit("Морковь")
+    assert suspicious_texts_counts()["submitted"] == 4
+    assert "duplicate" not in suspicious_texts_counts()
+
+
+def test_analyzed_texts_are_not_sent_to_gpt_again(fill_obscene_words, suspicious_texts_counts):
+    gpt_client = FakeGPTClient()
+    normalize_word = ObscenityFilterService().normalize_word
+    collector = SuspiciousWordsCollector(gpt_client, normalize_word, background=False)
+    collector.submit("Помидоры очень вкусные")
+    collector.submit("Помидоры очень вкусные")
+    collector.drain()
+    assert suspicious_texts_counts() == {"submitted": 2, "duplicate": 1, "analyzed": 1}
+
+    other_worker_collector = SuspiciousWordsCollector(gpt_client, normalize_word, background=False)
+    other_worker_collector.submit("Помидоры, очень вкусные!")
+    other_worker_collector.submit("очень вкусные Помидоры")
+    # consists only of known obscene and suspicious words
+    other_worker_collector.submit("Банан Помидоры")
+    other_worker_collector.drain()
+
+    assert len(gpt_client.prompts) == 1
+    assert suspicious_texts_counts() == {"submitted": 5, "duplicate": 3, "known_words": 1, "analyzed": 1}
+
+
+def test_read_csv_words():
+    csv_file = io.StringIO('Банан,Груша\n\n"Пиво с рыбкой", \nЯблоко\n')
+    assert list(read_csv_words(csv_file)) == ["Банан", "Груша", "Пиво с рыбкой", "Яблоко"]
+
+
+def test_import_obscene_words(fill_obscene_words, obscenity_filter_service, django_assert_max_num_queries):
+    assert not obscenity_filter_service.is_word_obscene("Пиво")
+    progress = []
+    words = ["Банан", "Пиво", "Пиво", " Агент007 ", "Помидор", "Огурец", "Пиво" * 64]
+    # savepoint, upsert, skeletons insert and savepoint release per chunk, one version bump
+    with django_assert_max_num_queries(13):
+        result = obscenity_filter_service.import_obscene_words(words, chunk_size=3, progress=progress.append)
+    assert result == (5, 1)
+    assert progress == [2, 5, 5]
+    assert ObsceneWord.objects.count() == 8
+    assert ObsceneWord.objects.get(value=" Агент007 ").normalized_value == "agent007"
+    assert set(ObsceneWordSkeleton.objects.filter(word__value=" Агент007 ").values_list("value", flat=True)) == {
+        "agentog", "agent07", "agentoog", "agent007",
+    }
+    assert obscenity_filter_service.is_word_obscene("Пиво")
+
+
+def test_failed_import_bumps_dictionary_version(fill_obscene_words, obscenity_filter_service):
+    from api.internal.obscenity_filter.services.dictionary_version import get_dictionary_version
+
+    assert not obscenity_filter_service.is_word_obscene("Пиво")
+    version = get_dictionary_version()
+
+    def fail(imported):
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        obscenity_filter_service.import_obscene_words(["Пиво", "Помидор"], chunk_size=1, progress=fail)
+    assert get_dictionary_version() > version
+    # the committed chunk is not hidden by the verdict cached before import
+    assert obscenity_filter_service.is_word_obscene("Пиво")
+
+
+def test_import_obscene_words_command(db, tmp_path):
+    from django.core.management import call_command
+
+    csv_path = tmp_path / "words.csv"
+    csv_path.write_text(f"Банан,Груша\nЯблоко,{'Груша' * 52}\n", encoding="utf-8")
+    stdout = io.StringIO()
+    call_command("import_obscene_words", str(csv_path), chunk_size=2, stdout=stdout)
+    assert set(ObsceneWord.objects.values_list("normalized_value", flat=True)) == {"banan", "grusha", "yabloko"}
+    assert "1 too long words were skipped" in stdout.getvalue()
+
+
+def test_get_texts_obscene_words(fill_obscene_words, obscenity_filter_service):
+    texts = ["Бананы и бананы, Ябл0ки", "Помидоры очень вкусные"]
+    assert obscenity_filter_service.get_texts_obscene_words(texts) == [["Банан", "Яблоко"], []]
+
+
+def test_scan_corpus_command(fill_obscene_words, tmp_path):
+    from django.core.management import call_command
+
+    input_path = tmp_path / "corpus.jsonl"
+    output_path = tmp_path / "verdicts.jsonl"
+    texts = ["Бананы очень вкусные", "Помидоры очень вкусные", "Груша", "Огурцы"]
+    input_path.write_text(
+        "".join(json.dumps({"id": i, "text": text}, ensure_ascii=False) + "\n" for i, text in enumerate(texts)),
+        encoding="utf-8",
+    )
+    # interrupted run: two records and a half of the third one
+    output_path.write_text(
+        '{"line": 0, "id": 0, "is_obscene": true, "matched_words": ["Банан"]}\n'
+        '{"line": 1, "id": 1, "is_obscene": false, "matched_words": []}\n'
+        '{"line": 2, "id"',
+        encoding="utf-8",
+    )
+
+    call_command(
+        "scan_corpus", str(input_path), str(output_path),
+        id_field="id", processes=0, chunk_size=1, resume=True, stdout=io.StringIO(),
+    )
+
+    verdicts = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+    assert [verdict["line"] for verdict in verdicts] == [0, 1, 2, 3]
+    assert [verdict["is_obscene"] for verdict in verdicts] == [True, False, True, False]
+    assert verdicts[2]["matched_words"] == ["Груша"]
+
+
+def test_scan_corpus_workers_are_configured_like_api(fill_obscene_words, monkeypatch):
+    from api.internal.obscenity_filter import app
+    from api.management.commands import scan_corpus
+
+    monkeypatch.setattr(app, "OBSCENITY_PREFILTER", True)
+    monkeypatch.setattr(app, "OBSCENITY_COMPOUND_CHECK", True)
+    monkeypatch.setattr(scan_corpus, "_worker_service", None)
+    scan_corpus.init_worker()
+    worker_service = scan_corpus._worker_service
+    assert isinstance(worker_service.backend, InMemoryTrigramBackend)
+    assert isinstance(worker_service.prefilter, DictionaryPrefilter)
+    assert isinstance(worker_service.compound_detector, CompoundDetector)
+    assert not worker_service.suspicious_words_check
+    assert worker_service.get_texts_obscene_words(["Супербанан"]) == [["Банан"]]
+
+
+def test_aho_corasick_finds_all_occurrences():
+    automaton = AhoCorasickAutomaton(["he", "she", "his", "hers", ""])
+    assert sorted(
+        (start, automaton.patterns[pattern_id]) for start, pattern_id in automaton.iter_matches("ushers")
+    ) == [(1, "she"), (2, "he"), (2, "hers")]
+
+
+@pytest.fixture
+def prefilter():
+    service = ObscenityFilterService()
+    prefilter = DictionaryPrefilter()
+    prefilter.load_entries(
+        (word, service.normalize_word(word), threshold)
+        for word, threshold in [("Банан", None), ("Яблоко", None), ("Груша", 0.9), ("Гранат", None)]
+    )
+    return prefilter
+
+
+def test_prefilter_resolves_exact_hits_and_hopeless_candidates(prefilter):
+    resolved, unresolved = prefilter.resolve(["banan", "banany", "grusha", "grushi", "i", "pomidor"], 0.6)
+    assert resolved == {"banan": "Банан", "banany": "Банан", "grusha": "Груша", "i": None}
+    assert unresolved == ["grushi", "pomidor"]
+
+
+def test_prefilter_respects_word_threshold(prefilter):
+    # both contain a dictionary word, but similarity of "grushami" to "grusha" is less than its threshold 0.9
+    resolved, unresolved = prefilter.resolve(["grushami", "bananami"], 0.1)
+    assert resolved == {"bananami": "Банан"}
+    assert unresolved == ["grushami"]
+
+
+def test_prefilter_saves_backend_queries(fill_obscene_words, django_assert_num_queries):
+    service = ObscenityFilterService(
+        obscenity_indicator=0.6, prefilter=DictionaryPrefilter(), verdict_cache_size=0
+    )
+    assert service.is_text_obscene("Бананы очень вкусные")
+    # only dictionary version is read, the prefilter resolves everything
+    with django_assert_num_queries(1):
+        assert service.is_text_obscene("Бананы и груша")
+        assert not service.is_text_obscene("и")
+
+
+@pytest.mark.parametrize(
+    "text, tokens",
+    [
+        ("Бананы  очень\nвкусные", [("Бананы", 0, 6), ("очень", 8, 13), ("вкусные", 14, 21)]),
+        ("Груша,банан!\t(яблоко)", [("Груша", 0, 5), ("банан", 6, 11), ("яблоко", 14, 20)]),
+        ("Б.а.н.а.н... б*нан - ок", [("Б.а.н.а.н", 0, 9), ("б*нан", 13, 18), ("ок", 21, 23)]),
+        (" , ... ", []),
+    ],
+)
+def test_tokenize(text, tokens):
+    assert [tuple(token) for token in tokenize(text)] == tokens
+    for value, start, end in tokens:
+        assert text[start:end] == value
+
+
+def test_get_words_are_distinct():
+    assert ObscenityFilterService()._get_words("банан груша банан\nбанан") == ["банан", "груша"]
+
+
+def test_analyze_text_returns_spans(fill_obscene_words, obscenity_filter_service):
+    text = "Бананы и гранаты,\nбананы и помидоры"
+    analysis = obscenity_filter_service.analyze_text(text)
+    assert analysis.is_obscene
+    assert analysis.spans == [
+        ObsceneSpan(0, 6, "Бананы", "Банан"),
+        ObsceneSpan(9, 16, "гранаты", "Гранат"),
+        ObsceneSpan(18, 24, "бананы", "Банан"),
+    ]
+    assert not obscenity_filter_service.analyze_text("Помидоры\tи огурцы").spans
+
+
+def test_repeated_words_are_checked_once(fill_obscene_words, obscenity_filter_service, monkeypatch):
+    checked_variants = []
+    find_matches = obscenity_filter_service.backend.find_matches
+
+    def spy(variants, obscenity_indicator):
+        checked_variants.extend(variants)
+        return find_matches(variants, obscenity_indicator)
+
+    monkeypatch.setattr(obscenity_filter_service.backend, "find_matches", spy)
+    obscenity_filter_service.analyze_text("огурцы огурцы\nогурцы, огурцы")
+    assert checked_variants.count("ogurcy") == 1
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 10, 100])
+def test_split_text_cuts_at_whitespace(chunk_size):
+    text = "Бананы и гранаты,\nбананы\tи помидоры"
+    chunks = list(split_text(text, chunk_size))
+    assert "".join(chunk for _, chunk in chunks) == text
+    for offset, chunk in chunks:
+        assert text[offset:offset + len(chunk)] == chunk
+        assert offset == 0 or text[offset - 1].isspace()
+
+
+def test_mask_text():
+    service = ObscenityFilterService()
+    spans = [ObsceneSpan(0, 6, "Бананы", "Банан"), ObsceneSpan(9, 16, "гранаты", "Гранат")]
+    assert service.mask_text("Бананы и гранаты!", spans) == "****** и *******!"
+
+
+def test_censor_text(app_obscenity_filter_service, fill_obscene_words, client):
+    response = client.post("/api/text/censor", {"text": "Бананы и помидоры"}, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json() == {
+        "text": "****** и помидоры",
+        "spans": [{"start": 0, "end": 6, "word": "Бананы", "match": "Банан"}],
+    }
+
+
+def test_censor_text_respects_word_threshold(fill_obscene_words, obscenity_filter_service):
+    ObsceneWord.objects.filter(value="Банан").update(similarity=0.9)
+    obscenity_filter_service.dictionary_changed()
+    assert obscenity_filter_service.censor_text("Бананы и банан").text == "Бананы и *****"
+
+
+def test_censor_text_stream(app_obscenity_filter_service, fill_obscene_words, client):
+    text = "Бананы и помидоры, " * 1000 + "гранаты"
+    response = client.post("/api/text/censor/stream", {"text": text}, content_type="application/json")
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    chunks = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+    assert len(chunks) > 1
+    censored_text = "".join(chunk["text"] for chunk in chunks)
+    assert censored_text == "****** и помидоры, " * 1000 + "*******"
+    spans = [span for chunk in chunks for span in chunk["spans"]]
+    assert len(spans) == 1001
+    assert all(censored_text[span["start"]:span["end"]] == "*" * len(span["word"]) for span in spans)
+
+
+def test_benchmark_command(db, tmp_path):
+    from django.core.management import call_command
+
+    output_path = tmp_path / "benchmark.jsonl"
+    call_command(
+        "benchmark",
+        "--dictionary-sizes=20,50",
+        "--text-lengths=10,30",
+        "--word-calls=5",
+        "--text-calls=1",
+        f"--output={output_path}",
+    )
+    results = [json.loads(line) for line in output_path.read_text().splitlines()]
+    benchmarks = {(result["benchmark"], result.get("backend")) for result in results}
+    assert {
+        ("normalize_text", None),
+        ("import_csv", None),
+        ("is_word_obscene", "postgres"),
+        ("is_text_obscene", "memory"),
+        ("get_similar_words", "postgres"),
+    } <= benchmarks
+    assert {result["dictionary_size"] for result in results if result["benchmark"] == "import_csv"} == {20, 50}
+    text_checks = [result for result in results if result["benchmark"] == "is_text_obscene"]
+    # postgres checks all words in one query, memory backend only checks dictionary version
+    assert all(result["queries_per_call"] == 1 for result in text_checks)
+    # generated dictionary is rolled back
+    assert not ObsceneWord.objects.exists()
+
+
+def test_benchmark_connections_command(transactional_db, tmp_path):
+    from django.core.management import call_command
+
+    output_path = tmp_path / "connections.jsonl"
+    call_command("benchmark_connections", "--threads=2", "--requests=3", f"--output={output_path}")
+    result = json.loads(output_path.read_text())
+    assert result["requests"] == 6
+    assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    # without persistent connections every request opens a connection
+    assert result["connections_per_request"] == 1
+
+
+def test_disabled_metrics_do_nothing(tmp_path):
+    registry = MetricsRegistry(enabled=False, directory=str(tmp_path))
+    assert registry.stage("tokenize") is NULL_TIMER
+    registry.observe("obscenity_text_tokens", 3)
+    registry.flush()
+    assert registry.collect() == (dict(), dict())
+    assert not list(tmp_path.iterdir())
+
+
+def test_metrics_render_histograms():
+    registry = MetricsRegistry(enabled=True, directory="")
+    for tokens in [1, 3, 3, 20000]:
+        registry.observe("obscenity_text_tokens", tokens)
+    registry.inc("obscenity_llm_tokens_total", 10, kind="prompt")
+    lines = registry.render().splitlines()
+    assert 'obscenity_text_tokens_bucket{le="1"} 1' in lines
+    assert 'obscenity_text_tokens_bucket{le="5"} 3' in lines
+    assert 'obscenity_text_tokens_bucket{le="10000"} 3' in lines
+    assert 'obscenity_text_tokens_bucket{le="+Inf"} 4' in lines
+    assert "obscenity_text_tokens_sum 20007.0" in lines
+    assert "obscenity_text_tokens_count 4" in lines
+    assert 'obscenity_llm_tokens_total{kind="prompt"} 10' in lines
+
+
+def test_metrics_are_aggregated_across_processes(tmp_path):
+    registry = MetricsRegistry(enabled=True, directory=str(tmp_path))
+    with registry.stage("backend"):
+        pass
+    registry.flush()
+    # file of another worker
+    (own_file,) = tmp_path.iterdir()
+    (tmp_path / "metrics_1.json").write_text(own_file.read_text())
+    assert 'obscenity_stage_seconds_count{stage="backend"} 2' in registry.render().splitlines()
+
+
+def test_metrics_of_exited_workers_are_kept_in_totals(tmp_path):
+    registry = MetricsRegistry(enabled=True, directory=str(tmp_path))
+    registry.inc("obscenity_llm_tokens_total", 10, kind="prompt")
+    registry.flush()
+    (own_file,) = tmp_path.iterdir()
+    for pid in (1, 2):
+        (tmp_path / f"metrics_{pid}.json").write_text(own_file.read_text())
+        registry.mark_process_dead(pid)
+    assert {path.name for path in tmp_path.iterdir()} == {"metrics_dead.json", own_file.name}
+    assert 'obscenity_llm_tokens_total{kind="prompt"} 30' in registry.render().splitlines()
+
+
+def test_metrics_endpoint(app_obscenity_filter_service, fill_obscene_words, client, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(metrics, "directory", "")
+    client.post("/api/text", {"text": "Помидоры очень вкусные"}, content_type="application/json")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.content.decode()
+    assert 'obscenity_stage_seconds_count{stage="tokenize"}' in body
+    assert 'obscenity_request_db_queries_count{route="api/text"}' in body
+    assert re.search(r'obscenity_request_seconds_count\{route="api/text"\} [1-9]', body)
+
+
+def test_metrics_endpoint_is_disabled_by_default(client):
+    assert client.get("/metrics").status_code == 404
+
+
+def test_similar_words_of_text_are_found_in_one_query(fill_obscene_words, django_assert_num_queries):
+    service = ObscenityFilterService(backend=get_backend("postgres"), verdict_cache_size=0)
+    with django_assert_num_queries(1):
+        similar_words = service.get_similar_words("Бананы и груши бананы", limit=2)
+    assert list(similar_words) == ["Бананы", "и", "груши", "бананы"]
+    assert similar_words["Бананы"][0].value == "Банан"
+    assert all(len(words) == 2 for words in similar_words.values())
+
+
+def test_similar_words_are_ordered_by_similarity(fill_obscene_words):
+    service = ObscenityFilterService(backend=get_backend("postgres"), verdict_cache_size=0)
+    similar_words = service.get_similar_words("Грант и бананы", limit=4)
+    assert similar_words["Грант"][0].value == "Гранат"
+    assert similar_words["бананы"][0].value == "Банан"
+    for words in similar_words.values():
+        similarities = [word.calc_similarity for word in words]
+        assert len(similarities) == 4
+        assert similarities == sorted(similarities, reverse=True)
+
+
+def test_similar_words_limit(app_obscenity_filter_service, fill_obscene_words, client):
+    response = client.post("/api/text/obscene-words", {"text": "Бананы", "limit": 3}, content_type="application/json")
+    assert response.status_code == 200
+    similar_words = response.json()["Бананы"]
+    assert len(similar_words) == 3
+    assert similar_words[0]["value"] == "Банан"
+
+    response = client.post("/api/text/obscene-words", {"text": "Бананы", "limit": 0}, content_type="application/json")
+    assert response.status_code == 422
+
+
+@pytest.fixture
+def compound_detector():
+    detector = CompoundDetector(min_length=4)
+    detector.load_entries([("Банан", "banan", None), ("Груша", "grusha", None), ("Кот", "kot", None)])
+    return detector
+
+
+@pytest.mark.parametrize(
+    "words, hits",
+    [
+        (["superbanan", "vkusnyj"], [(0, 0, "Банан")]),
+        (["b", "a", "n", "a", "n"], [(0, 4, "Банан")]),
+        (["gru", "", "sha"], [(0, 2, "Груша")]),
+        # "banan" is made of a part of "bar" and "anas"
+        (["bar", "bananas"], [(1, 1, "Банан")]),
+        (["ba", "nananas"], []),
+        # too short to be searched inside other words
+        (["kotik"], []),
+    ],
+)
+def test_compound_detector(compound_detector, words, hits):
+    assert compound_detector.find(words) == hits
+
+
+@pytest.mark.parametrize(
+    "word, folded_word, skeletons",
+    [
+        ("Банан", "banan", ["banan"]),
+        ("Ябл00кко", "yabloko", ["yabloko", "yabl0ko", "yablookko", "yabl00kko"]),
+        ("Бaнaн", "banan", ["banan"]),
+        ("banan", "banan", ["banan", "bapap"]),
+        ("***", "", []),
+    ],
+)
+def test_fold_word(word, folded_word, skeletons):
+    normalize_word = ObscenityFilterService().normalize_word
+    assert fold_word(word, normalize_word) == folded_word
+    assert get_skeletons(word, normalize_word) == skeletons
+
+
+def test_skeletons_are_saved_on_write(db, obscenity_filter_service):
+    word = obscenity_filter_service.create_obscene_word("Ябл00кко")
+    assert "yabloko" in set(word.skeletons.values_list("value", flat=True))
+    word.value = "Груша"
+    word.save()
+    obscenity_filter_service.save_skeletons([word])
+    assert list(word.skeletons.values_list("value", flat=True)) == ["grusha"]
+
+
+def test_skeleton_backend_looks_up_word_once(fill_obscene_words, django_assert_num_queries):
+    service = ObscenityFilterService(obscenity_indicator=0.6, backend=get_backend("skeleton"), verdict_cache_size=0)
+    assert service.get_word_variants("Ябл00кко") == ["yabloko"]
+    assert service.is_word_obscene("Ябл00кко")
+    with django_assert_num_queries(1):
+        assert service.is_text_obscene("Вкусные Бaнaны")
+    with pytest.raises(ValueError):
+        ObscenityFilterService(backend=get_backend("skeleton"), prefilter=DictionaryPrefilter())
+
+
+def test_compound_detector_respects_word_threshold(compound_detector):
+    compound_detector.add_entries([("Помидор", "pomidor", 0.9)])
+    # similarity of "superpomidor" to "pomidor" is less than its threshold
+    assert compound_detector.find(["superpomidor", "pomidory"]) == []
+    assert compound_detector.find(["po", "mi", "dor"]) == [(0, 2, "Помидор")]
+
+
+def test_compound_words_are_found(fill_obscene_words):
+    service = ObscenityFilterService(obscenity_indicator=0.6, compound_detector=CompoundDetector())
+    assert not service.is_text_obscene("Супер вкусный помидор")
+    assert service.is_text_obscene("Супербанан")
+    analysis = service.analyze_text("Вкусный б а н а н и гра нат")
+    assert [(span.word, span.match) for span in analysis.spans] == [("б а н а н", "Банан"), ("гра нат", "Гранат")]
+    assert service.censor_text("Я б л 0 к о!").text == "***********!"
+    assert service.get_texts_obscene_words(["суперГРУША", "груш а"]) == [["Груша"], ["Груша"]]
+
+
+def test_compound_words_respect_word_threshold(fill_obscene_words):
+    ObsceneWord.objects.filter(value="Банан").update(similarity=0.9)
+    service = ObscenityFilterService(obscenity_indicator=0.6, compound_detector=CompoundDetector())
+    assert not service.is_text_obscene("Супербанан")
+    assert service.censor_text("Супербанан и б а н а н").text == "Супербанан и *********"
+
+
+def test_snapshot_gives_same_similarities_as_index(tmp_path):
+    entries = [("Банан", "banan", None), ("Груша", "grusha", 0.7), ("Пиво с рыбкой", "pivo s rybkoj", None)]
+    path = str(tmp_path / "dictionary.snapshot")
+    assert write_snapshot(path, entries, dictionary_version=5) == 3
+    assert open_snapshot(path, dictionary_version=6) is None
+    snapshot = open_snapshot(path, dictionary_version=5)
+    assert list(snapshot.iter_entries()) == entries
+    index = TrigramIndex()
+    for entry in entries:
+        index.add(*entry)
+    for word in ["banany", "grushi", "pivo", "pomidor", ""]:
+        assert snapshot.similarities(word) == index.similarities(word)
+
+
+def test_broken_snapshot_is_not_mapped(tmp_path):
+    path = tmp_path / "dictionary.snapshot"
+    path.write_bytes(b"not a snapshot")
+    assert open_snapshot(str(path), dictionary_version=0) is None
+    assert open_snapshot(str(tmp_path / "missing.snapshot"), dictionary_version=0) is None
+
+
+def test_workers_load_dictionary_snapshot(fill_obscene_words, tmp_path, django_assert_num_queries):
+    from django.core.management import call_command
+
+    path = str(tmp_path / "dictionary.snapshot")
+    call_command("build_dictionary_snapshot", output=path, stdout=io.StringIO())
+    backend = InMemoryTrigramBackend(snapshot_path=path)
+    # only dictionary version is read
+    with django_assert_num_queries(1):
+        assert isinstance(backend.get_index(), DictionarySnapshot)
+    assert backend.find_matches(["banany", "pomidor"], 0.6) == {"banany": "Банан"}
+
+    ObscenityFilterService().create_obscene_word("Пиво")
+    backend.invalidate()
+    assert isinstance(backend.get_index(), TrigramIndex)
+    assert backend.find_matches(["pivo"], 0.6) == {"pivo": "Пиво"}
+
+
+def test_gpt_client_is_created_lazily():
+    from api.internal.obscenity_filter.services.gpt_client import LazyOpenAIClient
+
+    gpt_client = LazyOpenAIClient(api_key="key", base_url="http://localhost")
+    service = ObscenityFilterService(suspicious_words_check=True, gpt_client=gpt_client)
+    assert not gpt_client.is_created
+    assert service.suspicious_words_collector.gpt_client.chat is not None
+    assert gpt_client.is_created
+
+
+def test_warmup_loads_dictionary_copies(fill_obscene_words, django_assert_num_queries):
+    service = ObscenityFilterService(
+        obscenity_indicator=0.6,
+        backend=get_backend("memory"),
+        prefilter=DictionaryPrefilter(),
+        compound_detector=CompoundDetector(),
+    )
+    service.warmup()
+    assert service.is_warmed_up
+    # only dictionary version is read
+    with django_assert_num_queries(1):
+        assert service.is_text_obscene("Супербананы")
+
+
+def test_ready_after_warmup(app_obscenity_filter_service, client, monkeypatch):
+    monkeypatch.setattr(app_obscenity_filter_service, "is_warmed_up", False)
+    assert client.get("/api/health/ready").status_code == 503
+    app_obscenity_filter_service.warmup()
+    assert client.get("/api/health/ready").status_code == 200
+
+
+def test_failed_warmup_is_retried_by_readiness_probe(app_obscenity_filter_service, client, monkeypatch):
+    import importlib.util
+
+    from django.conf import settings
+
+    sync_dictionary_version = app_obscenity_filter_service.sync_dictionary_version
+    database_is_down = True
+
+    def sync_or_fail():
+        if database_is_down:
+            raise ConnectionError("database is down")
+        sync_dictionary_version()
+
+    monkeypatch.setattr(app_obscenity_filter_service, "is_warmed_up", False)
+    monkeypatch.setattr(app_obscenity_filter_service, "sync_dictionary_version", sync_or_fail)
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", settings.BASE_DIR / "gunicorn.conf.py")
+    gunicorn_conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gunicorn_conf)
+    # neither the master nor a worker fails
+    gunicorn_conf.when_ready(SimpleNamespace(cfg=SimpleNamespace(preload_app=True)))
+    gunicorn_conf.post_worker_init(None)
+    assert not app_obscenity_filter_service.is_warmed_up
+    assert client.get("/api/health/ready").status_code == 503
+
+    database_is_down = False
+    assert client.get("/api/health/ready").status_code == 200
+    assert app_obscenity_filter_service.is_warmed_up
+
+
+@pytest.fixture
+def shared_cache(db):
+    from django.core.cache import caches
+
+    from api.internal.obscenity_filter.services.shared_cache import SharedVerdictCache
+
+    shared_cache = SharedVerdictCache(lock_timeout=0.5)
+    yield shared_cache
+    caches[shared_cache.alias].clear()
+
+
+def test_shared_cache_hit_doesnt_touch_filter(
+        shared_cache, monkeypatch, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    from api.internal.obscenity_filter.services import dictionary_version
+    from api.internal.obscenity_filter.transport.handlers import TextHandler
+    from api.internal.obscenity_filter.transport.requests import TextIn
+
+    checked_texts = []
+    service = SimpleNamespace(is_text_obscene=lambda text: checked_texts.append(text) or True)
+    handler = TextHandler(service, shared_cache=shared_cache)
+    assert handler.check_text(None, TextIn(text="Бананы очень вкусные"))[0] == 400
+    with django_assert_num_queries(0):
+        assert handler.check_text(None, TextIn(text="Бананы, очень  вкусные!"))[0] == 400
+    assert checked_texts == ["Бананы очень вкусные"]
+
+    monkeypatch.setattr(dictionary_version, "SHARED_VERDICT_CACHE", True)
+    with django_capture_on_commit_callbacks(execute=True):
+        dictionary_version.bump_dictionary_version()
+    handler.check_text(None, TextIn(text="Бананы очень вкусные"))
+    assert len(checked_texts) == 2
+
+
+def test_shared_cache_waits_for_other_worker(shared_cache):
+    key = shared_cache._get_key("check", shared_cache._get_version(), "Бананы")
+    shared_cache.cache.add(f"{key}:lock", True)
+    other_worker = threading.Timer(0.1, lambda: shared_cache.cache.set(key, True))
+    other_worker.start()
+    assert shared_cache.get_or_compute("check", "Бананы", lambda: pytest.fail("verdict is computed twice"))
+    other_worker.join()
+
+
+def test_read_replay_requests(tmp_path):
+    from api.management.commands.replay_load import read_requests
+
+    requests_path = tmp_path / "requests.jsonl"
+    requests_path.write_text('{"text": "Бананы"}\n\n{"path": "/api/text/censor", "body": {"text": "Груша"}}\n')
+    requests = read_requests(str(requests_path), ["/api/text/", "/api/text/obscene-words"], limit=None)
+    assert [(request.path, json.loads(request.body)) for request in requests] == [
+        ("/api/text/", {"text": "Бананы"}),
+        ("/api/text/obscene-words", {"text": "Бананы"}),
+        ("/api/text/censor", {"text": "Груша"}),
+    ]
+
+
+def test_replay_load_command(app_obscenity_filter_service, fill_obscene_words, transactional_db, tmp_path):
+    from django.core.management import call_command
+
+    requests_path = tmp_path / "requests.jsonl"
+    requests_path.write_text('{"text": "Бананы очень вкусные"}\n{"text": "Помидоры", "limit": 2}\n')
+    output_path = tmp_path / "replay.jsonl"
+    call_command("replay_load", str(requests_path), "--concurrency=2", "--repeat=2", f"--output={output_path}")
+    results = {result["path"]: result for result in map(json.loads, output_path.read_text().splitlines())}
+    assert set(results) == {"/api/text/", "/api/text/obscene-words"}
+    assert results["/api/text/"]["statuses"] == {"200": 2, "400": 2}
+    assert results["/api/text/obscene-words"]["errors"] == 0
+    assert all(result["queries_per_request"] >= 1 for result in results.values())
+
+
+def test_verdict_cache_retains_kept_entries():
+    cache = VerdictCache(maxsize=2, ttl=60)
+    cache.sync_version(1)
+    cache.set("a", "Банан")
+    cache.set("b", None)
+    cache.retain(2, lambda match: match is not None)
+    assert cache.version == 2
+    assert cache.get("a") == "Банан"
+    assert cache.get("b") is MISSING
+
+
+def test_added_entries_are_added_to_loaded_copies(prefilter, compound_detector):
+    (loaded_dictionary,) = prefilter._dictionaries
+    prefilter.add_entries([("Пиво", "pivo", None), ("Банан", "banan", None)])
+    prefilter.add_entries([("Огурец", "ogurec", None)])
+    resolved, unresolved = prefilter.resolve(["pivo", "banany", "ogurec", "pomidor"], 0.6)
+    assert resolved == {"pivo": "Пиво", "banany": "Банан", "ogurec": "Огурец"}
+    # only the dictionary of added words is rebuilt
+    assert prefilter._dictionaries[0] is loaded_dictionary
+    assert len(prefilter._dictionaries[1].entries) == 3
+
+    (loaded_dictionary,) = compound_detector._dictionaries
+    compound_detector.add_entries([("Помидор", "pomidor", None)])
+    compound_detector.add_entries([("Огурец", "ogurec", None)])
+    assert compound_detector.find(["super", "pomidory", "ogurec"]) == [(1, 1, "Помидор"), (2, 2, "Огурец")]
+    assert compound_detector.find(["superbanan"]) == [(0, 0, "Банан")]
+    assert compound_detector._dictionaries[0] is loaded_dictionary
+
+
+def test_words_added_to_snapshot_are_kept_next_to_it(fill_obscene_words, tmp_path, django_assert_num_queries):
+    from django.core.management import call_command
+
+    from api.internal.obscenity_filter.services.backends import LayeredIndex
+
+    path = str(tmp_path / "dictionary.snapshot")
+    call_command("build_dictionary_snapshot", output=path, stdout=io.StringIO())
+    backend = InMemoryTrigramBackend(snapshot_path=path)
+    snapshot = backend.get_index()
+    with django_assert_num_queries(0):
+        backend.add_entries([("Пиво", "pivo", None)])
+        backend.add_entries([("Огурец", "ogurec", 0.9)])
+        assert backend.find_matches(["pivo", "banany", "ogurcy"], 0.6) == {"pivo": "Пиво", "banany": "Банан"}
+        assert backend.get_similar_words(["piva"], 1)["piva"][0].value == "Пиво"
+    index = backend.get_index()
+    assert isinstance(index, LayeredIndex)
+    assert index.base is snapshot
+    assert len(index) == 6
+
+
+def test_copies_are_searched_while_they_are_reloaded(prefilter, compound_detector):
+    entries = [(f"Слово{i}", f"slovo{i}", None) for i in range(300)] + [("Банан", "banan", None)]
+    stop = threading.Event()
+
+    def reload():
+        while not stop.is_set():
+            prefilter.load_entries(entries)
+            prefilter.add_entries([("Пиво", "pivo", None)])
+            compound_detector.load_entries(entries)
+            compound_detector.add_entries([("Пиво", "pivo", None)])
+
+    thread = threading.Thread(target=reload)
+    thread.start()
+    try:
+        for _ in range(300):
+            assert prefilter.resolve(["banan", "banany"], 0.6)[0] == {"banan": "Банан", "banany": "Банан"}
+            assert compound_detector.find(["superbanan"]) == [(0, 0, "Банан")]
+    finally:
+        stop.set()
+        thread.join()
+
+
+@pytest.fixture
+def suspicious_words(db):
+    return SuspiciousWord.objects.bulk_create(SuspiciousWord(value=word) for word in ["Пиво", "Помидор", "Огурец"])
+
+
+def test_approved_words_are_added_incrementally(fill_obscene_words, suspicious_words, django_assert_num_queries):
+    service = ObscenityFilterService(
+        obscenity_indicator=0.6, backend=get_backend("memory"), prefilter=DictionaryPrefilter()
+    )
+    service.warmup()
+    index = service.backend.get_index()
+    assert service.is_word_obscene("Банан")
+    assert not service.is_word_obscene("Пиво")
+
+    approved = ObscenityFilterService().approve_suspicious_words([word.id for word in suspicious_words[:2]])
+    assert approved == 2
+    assert set(SuspiciousWord.objects.filter(status=SuspiciousWord.SuspiciousWordStatuses.ADDED).values_list(
+        "value", flat=True
+    )) == {"Пиво", "Помидор"}
+    # dictionary version and added words are read, the dictionary is not reloaded
+    with django_assert_num_queries(2):
+        assert service.is_word_obscene("Пиво")
+    assert service.backend.get_index() is index
+    assert service.word_cache.get("Банан") == "Банан"
+    # approved words are not approved again
+    assert ObscenityFilterService().approve_suspicious_words([word.id for word in suspicious_words]) == 1
+
+
+def test_dictionary_reset_reloads_copies(fill_obscene_words):
+    service = ObscenityFilterService(obscenity_indicator=0.6, backend=get_backend("memory"))
+    assert service.is_word_obscene("Банан")
+    index = service.backend.get_index()
+    ObsceneWord.objects.filter(value="Банан").delete()
+    ObscenityFilterService().dictionary_changed()
+    assert not service.is_word_obscene("Банан")
+    assert service.backend.get_index() is not index
+
+
+def test_moderation_api(app_obscenity_filter_service, suspicious_words, client, admin_client):
+    ids = [word.id for word in suspicious_words]
+    response = client.post("/api/suspicious-words/approve", {"ids": ids}, content_type="application/json")
+    assert response.status_code == 401
+
+    response = admin_client.post("/api/suspicious-words/approve", {"ids": ids[:2]}, content_type="application/json")
+    assert response.json() == {"processed": 2}
+    response = admin_client.post("/api/suspicious-words/decline", {"ids": ids}, content_type="application/json")
+    assert response.json() == {"processed": 1}
+    assert set(ObsceneWord.objects.values_list("value", flat=True)) == {"Пиво", "Помидор"}
+    assert SuspiciousWord.objects.get(value="Огурец").status == SuspiciousWord.SuspiciousWordStatuses.DECLINED
+
+
+def test_admin_does_not_edit_dictionary_version(rf):
+    from django.contrib import admin
+
+    obscene_words_admin = admin.site._registry[ObsceneWord]
+    assert list(obscene_words_admin.get_form(rf.get("/")).base_fields) == ["value", "similarity"]
+
+
+def test_admin_bulk_moderation_actions(app_obscenity_filter_service, suspicious_words, admin_client):
+    url = "/admin/api/suspiciousword/"
+    admin_client.post(url, {"action": "approve_selected", "_selected_action": [suspicious_words[0].id]})
+    admin_client.post(url, {"action": "decline_selected", "_selected_action": [word.id for word in suspicious_words]})
+    assert dict(SuspiciousWord.objects.values_list("value", "status")) == {
+        "Пиво": SuspiciousWord.SuspiciousWordStatuses.ADDED,
+        "Помидор": SuspiciousWord.SuspiciousWordStatuses.DECLINED,
+        "Огурец": SuspiciousWord.SuspiciousWordStatuses.DECLINED,
+    }
+    assert ObsceneWord.objects.filter(value="Пиво").exists()